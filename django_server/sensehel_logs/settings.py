@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'sensehel_logs_service.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -51,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'sensehel_logs_service.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'sensehel_logs.urls'
@@ -133,6 +135,76 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'sensehel_logs_service.rest.schema.APISchema'
 }
 
+# Submitted values are inserted in batches of at most VALUES_INSERT_BATCH_SIZE rows per INSERT statement; on
+# PostgreSQL, submissions of at least VALUES_COPY_THRESHOLD values are loaded with a single COPY instead.
+VALUES_INSERT_BATCH_SIZE = 1000
+VALUES_COPY_THRESHOLD = 5000
+
+# With VALUES_WRITE_BEHIND enabled, SubmitData only validates submitted values and queues them in process, replying
+# 202 Accepted; a background thread writes the queue in batches of up to VALUES_WRITE_BEHIND_BATCH_SIZE values, at
+# least every VALUES_WRITE_BEHIND_FLUSH_INTERVAL seconds, and once more on shutdown. Submissions which would grow the
+# queue beyond VALUES_WRITE_BEHIND_MAX_QUEUE values are refused with 503 for SenseHel to retry later. While the
+# database is unreachable, writing is retried after a delay doubling up to VALUES_WRITE_BEHIND_MAX_BACKOFF seconds.
+# Submissions which fail to be written otherwise, e.g. with a DataError, are retried on the following flushes, and
+# dropped, with their values logged, after VALUES_WRITE_BEHIND_MAX_ATTEMPTS attempts. Note that queued values are
+# lost if the process is killed before it can flush them.
+VALUES_WRITE_BEHIND = False
+VALUES_WRITE_BEHIND_FLUSH_INTERVAL = 1.0
+VALUES_WRITE_BEHIND_BATCH_SIZE = 5000
+VALUES_WRITE_BEHIND_MAX_QUEUE = 100000
+VALUES_WRITE_BEHIND_MAX_ATTEMPTS = 5
+VALUES_WRITE_BEHIND_MAX_BACKOFF = 60
+
+# Number of subscriptions for which the mapping of SenseHel attribute ids is kept in memory by each process, for at
+# most SUBSCRIPTION_CACHE_TTL seconds: changes are seen at once by the process making them, through signals, but
+# other worker processes keep accepting values for unsubscribed subscriptions or changed attributes until then.
+SUBSCRIPTION_CACHE_SIZE = 10000
+SUBSCRIPTION_CACHE_TTL = 60
+
+# Valid SenseHel authentication tokens are cached for AUTH_TOKEN_CACHE_TTL seconds. By default the cache is
+# per process, so a revoked token may be accepted by other worker processes until it expires there; set
+# AUTH_TOKEN_CACHE to the alias of a shared cache in CACHES to make revocation immediate across processes.
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_CACHE = None
+
+# Serve data submission and subscription retrieve through the native async views in
+# sensehel_logs_service.rest.async_views instead of DRF views. Only useful when running under ASGI, see README.md.
+ASYNC_VIEWS = False
+
+# The 24 hour previews embedded in the SenseHel UI are served from the cache named by PREVIEW_CACHE, downsampled to at
+# most PREVIEW_MAX_POINTS values per attribute, and rebuilt from the database at least every PREVIEW_CACHE_TIMEOUT
+# seconds. With several processes, use a shared cache to have the previews updated by data submission everywhere.
+PREVIEW_CACHE = 'default'
+PREVIEW_CACHE_TIMEOUT = 3600
+PREVIEW_MAX_POINTS = 1000
+
+# On PostgreSQL the value table is partitioned by month. The manage_value_partitions management command, to be run
+# e.g. daily from cron, creates the partitions for the current and the next VALUES_PARTITION_MONTHS_AHEAD months and,
+# if VALUES_RETENTION_MONTHS is set, removes the partitions of months older than that: dropped, or only detached
+# from the value table for archiving if VALUES_RETENTION_DROP is False. The rollups of removed values are kept.
+VALUES_PARTITION_MONTHS_AHEAD = 3
+VALUES_RETENTION_MONTHS = None
+VALUES_RETENTION_DROP = True
+
+# Values older than VALUES_HOT_DAYS days can be moved to cold storage, compressed into one row per attribute and
+# day, by the compress_values management command; see sensehel_logs_service.cold_storage.
+VALUES_HOT_DAYS = 90
+
+# Unsubscribed subscriptions are only marked deleted by the API. Their values are then deleted by the
+# purge_subscriptions management command in batches of SUBSCRIPTION_PURGE_BATCH_SIZE rows, each in its own short
+# transaction, so that the purge never holds locks for long and can be resumed after an interruption.
+SUBSCRIPTION_PURGE_BATCH_SIZE = 10000
+
+# Request, database and ingestion metrics of each process are exposed in the Prometheus text format at /metrics, to
+# staff users and to scrapers sending "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = None
+
+# Staff users can profile any request by adding a _profile GET parameter or an X-Profile header, see
+# sensehel_logs_service.profiling. The PROFILES_KEPT latest profiles are kept, listing the PROFILE_STATS_LINES
+# functions with the highest cumulative time.
+PROFILES_KEPT = 100
+PROFILE_STATS_LINES = 60
+
 LOG_DB_QUERIES = False
 
 if LOG_DB_QUERIES:
@@ -19,6 +19,7 @@ from django.views.generic import TemplateView
 
 from sensehel_logs_service.rest import urls as app_urls
 from sensehel_logs_service.rest import schema_view
+from sensehel_logs_service.metrics import metrics_view
 
 swagger_view = TemplateView.as_view(template_name='swagger-ui.html', extra_context={'schema_url': 'openapi-schema'})
 
@@ -26,5 +27,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('openapi/', schema_view, name='openapi-schema'),
     path('swagger-ui/', swagger_view, name='swagger-ui'),
-    path('api/', include(app_urls))
+    path('api/', include(app_urls)),
+    path('metrics', metrics_view, name='metrics')
 ]
@@ -1,14 +1,32 @@
+import uuid
+from datetime import datetime, timedelta
+
 from django.contrib import admin  # noqa
-from django.db.models import Count, Min, Avg, Max
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import EmptyResultSet, PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count, QuerySet
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
 from . import models
 
 
 @admin.register(models.Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
-    list_display = ['uuid', 'attributes']
+    list_display = ['uuid', 'attributes', 'deleted']
     search_fields = ['uuid']
-    list_filter = ['attributes__attribute_type']
+    list_filter = ['attributes__attribute_type', 'deleted']
+
+    def get_queryset(self, request):
+        # Include unsubscribed subscriptions awaiting purge:
+        return models.Subscription.all_objects.all()
 
     def attributes(self, subscription):
         return list(models.SensorAttribute.objects\
@@ -16,31 +34,32 @@ class SubscriptionAdmin(admin.ModelAdmin):
             .values_list('description', flat=True).distinct())
 
 
+def format_stat(value):
+    return '-' if value is None else '%s' % float('%.4g' % value)
+
+
 @admin.register(models.AttributeSubscription)
 class AttributeSubscriptionAdmin(admin.ModelAdmin):
     list_display = ['subscription', 'attribute_type', 'values', 'min', 'avg', 'max']
     list_filter = ['attribute_type']
     search_fields = ['subscription__uuid']
-
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            values_count=Count('values'),
-            min=Min('values__value'),
-            avg=Avg('values__value'),
-            max=Max('values__value')
-        )
+    list_select_related = ['subscription', 'attribute_type']
+    readonly_fields = ['values_count', 'values_sum', 'values_min', 'values_max']
 
     def values(self, attr):
         return attr.values_count
+    values.admin_order_field = 'values_count'
 
     def min(self, attr):
-        return '%s' % float('%.4g' % attr.min)
+        return format_stat(attr.values_min)
+    min.admin_order_field = 'values_min'
 
     def avg(self, attr):
-        return '%s' % float('%.4g' % attr.avg)
+        return format_stat(attr.values_avg)
 
     def max(self, attr):
-        return '%s' % float('%.4g' % attr.max)
+        return format_stat(attr.values_max)
+    max.admin_order_field = 'values_max'
 
 
 @admin.register(models.SensorAttribute)
@@ -54,12 +73,188 @@ class SensorAttributeAdmin(admin.ModelAdmin):
         return attr.subscriptions_
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using the row estimate of the PostgreSQL query planner as the count when it exceeds
+    exact_count_limit, instead of counting all matching rows.
+    """
+    exact_count_limit = 10000
+    estimated = False
+
+    @cached_property
+    def count(self):
+        if connection.vendor == 'postgresql' and isinstance(self.object_list, QuerySet):
+            # Not through QuerySet.explain(), which returns the plan parsed by psycopg2 as its Python repr:
+            try:
+                sql, params = self.object_list.order_by().query.sql_with_params()
+            except EmptyResultSet:
+                return 0
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            estimate = plan[0]['Plan']['Plan Rows']
+            if estimate > self.exact_count_limit:
+                self.estimated = True
+                return estimate
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Change list paging through the results newest first by primary key, continuing after the last primary key of
+    the previous page instead of skipping over an ever growing number of rows with OFFSET.
+    """
+    cursor_var = 'before'
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(self.cursor_var, None)
+        return params
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def get_results(self, request):
+        queryset = self.queryset
+        cursor = request.GET.get(self.cursor_var)
+        if cursor:
+            try:
+                queryset = queryset.filter(pk__lt=int(cursor))
+            except ValueError:
+                raise IncorrectLookupParameters
+        results = list(queryset[:self.list_per_page + 1])
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = results[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = bool(cursor) or len(results) > self.list_per_page
+        self.newest_url = self.get_query_string(remove=[self.cursor_var]) if cursor else None
+        self.older_url = self.get_query_string({self.cursor_var: self.result_list[-1].pk}) \
+            if len(results) > self.list_per_page else None
+
+
+class MonthListFilter(admin.SimpleListFilter):
+    """
+    Filter by month, listing the months for which there are values according to the daily rollups.
+    """
+    title = 'month'
+    parameter_name = 'month'
+
+    def lookups(self, request, model_admin):
+        return [(month.strftime('%Y-%m'), month.strftime('%B %Y'))
+                for month in models.DailyRollup.objects.dates('bucket', 'month', order='DESC')]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            try:
+                start = datetime.strptime(self.value(), '%Y-%m')
+            except ValueError:
+                raise IncorrectLookupParameters
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+            return queryset.filter(timestamp__gte=timezone.make_aware(start), timestamp__lt=timezone.make_aware(end))
+
+
+class DayListFilter(admin.SimpleListFilter):
+    """
+    Filter by day within the selected month, listing the days for which there are values according to the daily
+    rollups.
+    """
+    title = 'day'
+    parameter_name = 'day'
+
+    def lookups(self, request, model_admin):
+        month = request.GET.get(MonthListFilter.parameter_name, '')
+        try:
+            start = datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            return []
+        return [(day.isoformat(), day.strftime('%d %B %Y'))
+                for day in models.DailyRollup.objects.filter(bucket__year=start.year, bucket__month=start.month)
+                .dates('bucket', 'day')]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            try:
+                start = datetime.strptime(self.value(), '%Y-%m-%d')
+            except ValueError:
+                raise IncorrectLookupParameters
+            return queryset.filter(timestamp__gte=timezone.make_aware(start),
+                                   timestamp__lt=timezone.make_aware(start + timedelta(days=1)))
+
+
 @admin.register(models.Value)
 class ValueAdmin(admin.ModelAdmin):
     list_display = ('attribute', 'value', 'timestamp')
-    list_filter = ('attribute__attribute_type', )
+    list_filter = ('attribute__attribute_type', MonthListFilter, DayListFilter)
     search_fields = ['attribute__subscription__uuid']
-    date_hierarchy = 'timestamp'
+    paginator = EstimatedCountPaginator
+    sortable_by = []
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        # Only search for exact subscription UUIDs, by the ids of their attribute subscriptions so that the
+        # (attribute, timestamp) index can be used:
+        if not search_term:
+            return queryset, False
+        try:
+            subscription_uuid = uuid.UUID(search_term.strip())
+        except ValueError:
+            return queryset.none(), False
+        attribute_ids = models.AttributeSubscription.objects.filter(subscription__uuid=subscription_uuid)
+        return queryset.filter(attribute_id__in=list(attribute_ids.values_list('id', flat=True))), False
+
+
+@admin.register(models.RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'query_time_ms',
+                    'user']
+    list_filter = ['method', 'status_code']
+    search_fields = ['path']
+    fields = ['created_at', 'user', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'query_time_ms',
+              'download', 'sql_timeline', 'profile_stats']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def duration_ms(self, profile):
+        return f'{profile.duration * 1000:.1f}'
+
+    def query_time_ms(self, profile):
+        return f'{profile.query_time * 1000:.1f}'
+
+    def sql_timeline(self, profile):
+        return format_html('<pre>{}</pre>', '\n'.join(
+            f'{query["start"]:>10.1f} ms {query["duration"]:>8.1f} ms  {query["sql"]}' for query in profile.queries))
+
+    def profile_stats(self, profile):
+        return format_html('<pre>{}</pre>', profile.stats)
+
+    def download(self, profile):
+        url = reverse('admin:sensehel_logs_service_requestprofile_download', args=[profile.id])
+        return format_html('<a href="{}">{}.prof</a>', url, profile.id)
+    download.short_description = 'Raw profile, for pstats or snakeviz'
+
+    def get_urls(self):
+        return [path('<int:profile_id>/download/', self.admin_site.admin_view(self.download_view),
+                     name='sensehel_logs_service_requestprofile_download')] + super().get_urls()
+
+    def download_view(self, request, profile_id):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(models.RequestProfile, id=profile_id)
+        response = HttpResponse(bytes(profile.profile), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{profile.id}.prof"'
+        return response
 
 
 @admin.register(models.AuthenticationToken)
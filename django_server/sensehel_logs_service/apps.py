@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SensehelLogsServiceConfig(AppConfig):
     name = 'sensehel_logs_service'
+
+    def ready(self):
+        from sensehel_logs_service import signals  # noqa
@@ -0,0 +1,92 @@
+"""
+File formats and progress state shared by the import_values and export_values management commands.
+
+Values are transferred as NDJSON, one {"attribute": ..., "timestamp": ..., "value": ...} object per line, or as CSV
+with an attribute,timestamp,value header. The attribute is the SenseHel attribute id, as in data submissions, so
+files can be imported into another subscription with the same attributes, e.g. in another environment.
+
+The progress of a transfer is saved in a JSON state file after each batch, from which an interrupted transfer
+resumes. Rerunning a finished transfer with the same state file continues from where it stopped, importing lines
+appended to the file since, or exporting values received since.
+"""
+import csv
+import json
+import os
+from decimal import Decimal
+from io import StringIO
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sensehel_logs_service import ingestion
+
+FORMATS = ['ndjson', 'csv']
+CSV_HEADER = ['attribute', 'timestamp', 'value']
+
+
+def guess_format(path, file_format=None):
+    if file_format:
+        return file_format
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def load_state(path):
+    if not (path and os.path.exists(path)):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    """
+    Replace the state file atomically, so that an interruption never leaves it half written.
+    """
+    if path:
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(f'{path}.tmp', path)
+
+
+def parse_timestamp(text):
+    timestamp = parse_datetime(text)
+    if timestamp is None:
+        raise ValueError(f'Invalid timestamp: {text}')
+    return timestamp if timezone.is_aware(timestamp) else timezone.make_aware(timestamp)
+
+
+def parse_record(line, file_format, columns=CSV_HEADER):
+    """
+    Return the (SenseHel attribute id, timestamp, value) in a line of a file, raising ValueError if it is invalid.
+    """
+    if file_format == 'csv':
+        record = dict(zip(columns, next(csv.reader([line]))))
+    else:
+        record = json.loads(line)
+    try:
+        return (int(record['attribute']), parse_timestamp(record['timestamp']),
+                ingestion.round_value(Decimal(str(record['value']))))
+    except (KeyError, TypeError, ArithmeticError) as e:
+        raise ValueError(str(e))
+
+
+def format_rows(rows, file_format):
+    """
+    Return (SenseHel attribute id, timestamp, value) rows as lines of a file.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for attribute_id, timestamp, value in rows:
+        timestamp = timestamp.astimezone(timezone.utc).isoformat()
+        if file_format == 'csv':
+            writer.writerow([attribute_id, timestamp, value])
+        else:
+            buffer.write(f'{{"attribute": {attribute_id}, "timestamp": "{timestamp}", "value": {value}}}\n')
+    return buffer.getvalue()
+
+
+def last_timestamp(lines, file_format):
+    """
+    Return the timestamp of the last line of the given file lines.
+    """
+    line = lines.rstrip('\n').rsplit('\n', 1)[-1]
+    return parse_record(line, file_format)[1]
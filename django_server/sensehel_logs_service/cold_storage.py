@@ -0,0 +1,112 @@
+"""
+Cold storage of old values: the compress_values management command moves the values of each attribute subscription
+for each UTC day older than VALUES_HOT_DAYS days into a single ValueBlock row. Timestamps are stored as microsecond
+deltas and values as integers scaled by the decimal places of Value.value, as NumPy int64 arrays compressed with
+zlib; regular sensor readings compress to a few bytes per value, against the tens of bytes per value taken by the
+rows and index entries they replace.
+
+Retrieving values merges the blocks with the rows still in the Value table, skipping the blocks altogether for
+attribute subscriptions without any, or when only values newer than AttributeSubscription.cold_until are asked for.
+The rollups and statistics are not affected by compressing values; note however that the rebuild_rollups and
+rebuild_attribute_stats management commands only see the rows still in the Value table.
+"""
+import heapq
+import zlib
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from sensehel_logs_service import models
+
+DECIMAL_PLACES = models.Value._meta.get_field('value').decimal_places
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+DELETE_BATCH_SIZE = 500
+
+
+def day_start(day):
+    return datetime.combine(day, time(), tzinfo=timezone.utc)
+
+
+def encode(rows):
+    """
+    Encode (timestamp, value) rows, ordered by timestamp, as block data.
+    """
+    micros = np.array([(timestamp - EPOCH) // timedelta(microseconds=1) for timestamp, _ in rows], dtype=np.int64)
+    values = np.array([int(value.scaleb(DECIMAL_PLACES)) for _, value in rows], dtype=np.int64)
+    return zlib.compress(np.concatenate([np.diff(micros, prepend=0), values]).tobytes())
+
+
+def decode(data):
+    """
+    Return the (timestamp, value) rows encoded in the block data, ordered by timestamp.
+    """
+    deltas, values = np.split(np.frombuffer(zlib.decompress(data), dtype=np.int64), 2)
+    return [(EPOCH + timedelta(microseconds=micros), Decimal(value).scaleb(-DECIMAL_PLACES))
+            for micros, value in zip(np.cumsum(deltas).tolist(), values.tolist())]
+
+
+def compress_day(attribute, day):
+    """
+    Move the values of the attribute subscription for the UTC day to its block for the day, merging them with the
+    values already in the block, if any. Values for a timestamp already in the block are dropped. Return the number
+    of values moved.
+    """
+    start = day_start(day)
+    end = start + timedelta(days=1)
+    with transaction.atomic():
+        values = models.Value.objects.filter(attribute=attribute, timestamp__gte=start, timestamp__lt=end)
+        read = list(values.values_list('id', 'timestamp', 'value'))
+        if not read:
+            return 0
+        rows = {timestamp: value for _, timestamp, value in read}
+
+        block = models.ValueBlock.objects.select_for_update().filter(attribute=attribute, day=day).first()
+        if block is None:
+            block = models.ValueBlock(attribute=attribute, day=day)
+        else:
+            rows.update(decode(block.data))
+        block.count = len(rows)
+        block.data = encode(sorted(rows.items()))
+        block.save()
+
+        # Only the rows read above, not those stored since for the day, which are left for the next run:
+        ids = [id for id, _, _ in read]
+        moved = sum(values.filter(id__in=ids[i:i + DELETE_BATCH_SIZE]).delete()[0]
+                    for i in range(0, len(ids), DELETE_BATCH_SIZE))
+        models.AttributeSubscription.objects\
+            .filter(Q(cold_until__isnull=True) | Q(cold_until__lt=end), id=attribute.id).update(cold_until=end)
+    return moved
+
+
+def cold_rows(attribute_ids, gt=None, gte=None, lt=None):
+    """
+    Yield the (attribute_id, timestamp, value) rows stored in blocks of the given attribute subscriptions, ordered by
+    attribute and timestamp, optionally limited to a timestamp range. Blocks are read and decoded one at a time.
+    """
+    blocks = models.ValueBlock.objects.filter(attribute__in=attribute_ids).order_by('attribute_id', 'day')
+    if gt or gte:
+        blocks = blocks.filter(day__gte=(gt or gte).astimezone(timezone.utc).date())
+    if lt:
+        blocks = blocks.filter(day__lte=lt.astimezone(timezone.utc).date())
+
+    for attribute_id, data in blocks.values_list('attribute_id', 'data').iterator(chunk_size=100):
+        for timestamp, value in decode(data):
+            if not ((gt and timestamp <= gt) or (gte and timestamp < gte) or (lt and timestamp >= lt)):
+                yield attribute_id, timestamp, value
+
+
+def with_cold_rows(rows, attributes, gt=None, gte=None, lt=None):
+    """
+    Merge the (attribute_id, timestamp, value) rows read from the Value table for the given attribute subscriptions,
+    ordered by attribute and timestamp and limited to the given timestamp range, with the rows in their blocks.
+    """
+    since = gt or gte
+    attribute_ids = [attribute.id for attribute in attributes
+                     if attribute.cold_until and not (since and since >= attribute.cold_until)]
+    if not attribute_ids:
+        return rows
+    return heapq.merge(rows, cold_rows(attribute_ids, gt, gte, lt), key=lambda row: row[:2])
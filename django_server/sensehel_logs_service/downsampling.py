@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """
+    Select at most `threshold` points of the series (x, y) using the Largest-Triangle-Three-Buckets algorithm,
+    which keeps the visual shape of the series (peaks, dips) intact. The first and last points are always kept.
+    Returns the indices of the selected points, in ascending order.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Split the points between the first and the last one into threshold - 2 buckets of (nearly) equal size:
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (end, edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+
+        # Pick the point of this bucket forming the largest triangle with the previously selected point
+        # and the average of the next bucket:
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample(rows, max_points):
+    """
+    Downsample a list of (timestamp, value) tuples, ordered by timestamp, to at most `max_points` rows.
+    """
+    if len(rows) <= max_points:
+        return rows
+    x = [timestamp.timestamp() for timestamp, value in rows]
+    y = [value for timestamp, value in rows]
+    return [rows[i] for i in lttb(x, y, max_points)]
@@ -0,0 +1,324 @@
+import csv
+import functools
+import io
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sensehel_logs_service import cold_storage, models
+from sensehel_logs_service.caches import LRUCache
+
+ROLLUP_MODELS = [models.HourlyRollup, models.DailyRollup]
+
+VALUE_FIELD = models.Value._meta.get_field('value')
+MAX_VALUE = Decimal(10) ** (VALUE_FIELD.max_digits - VALUE_FIELD.decimal_places)
+
+# Subscription UUID -> {SenseHel attribute id: AttributeSubscription id}, invalidated through signals in the process
+# making the change, see sensehel_logs_service.signals, and expiring after SUBSCRIPTION_CACHE_TTL seconds in others:
+attribute_ids_cache = LRUCache(settings.SUBSCRIPTION_CACHE_SIZE, settings.SUBSCRIPTION_CACHE_TTL)
+
+# AttributeSubscription id -> subscription UUID, for the attribute subscriptions looked up above:
+subscription_uuids_cache = LRUCache(settings.SUBSCRIPTION_CACHE_SIZE, settings.SUBSCRIPTION_CACHE_TTL)
+
+# Sent after values have been stored, with the inserted values, the number of duplicates skipped, the inserted values
+# grouped by the UUID of their subscription as far as known from subscription_uuids_cache, and the (previous, new)
+# Subscription.updated_at by subscription UUID, as returned by touch_subscriptions:
+values_stored = Signal()
+
+
+def round_value(value):
+    """
+    Return the Decimal value rounded to the decimal places stored, raising ValueError if it cannot be stored. Values
+    with more decimals than stored are rounded rather than rejected.
+    """
+    if not value.is_finite():
+        raise ValueError('Ensure that the value is a finite number.')
+    # Checked before rounding too, as rounding a very large value would fail:
+    if abs(value) < MAX_VALUE:
+        value = value.quantize(Decimal(1).scaleb(-VALUE_FIELD.decimal_places))
+    if abs(value) >= MAX_VALUE:
+        raise ValueError(f'Ensure that the absolute value is less than {MAX_VALUE}.')
+    return value
+
+
+def get_attribute_ids(subscription_uuid):
+    """
+    Return a dict mapping the SenseHel attribute ids of the subscription with the given UUID to the ids of the
+    corresponding AttributeSubscriptions, or None if there is no such subscription.
+    """
+    try:
+        key = str(uuid.UUID(str(subscription_uuid)))
+    except ValueError:
+        return None
+
+    attribute_ids = attribute_ids_cache.get(key)
+    if attribute_ids is None:
+        attribute_ids = dict(models.AttributeSubscription.objects
+                             .filter(subscription__uuid=key, subscription__deleted=False)
+                             .values_list('attribute_id', 'id'))
+        if not (attribute_ids or models.Subscription.objects.filter(uuid=key).exists()):
+            return None
+        attribute_ids_cache.set(key, attribute_ids)
+        for attribute_subscription_id in attribute_ids.values():
+            subscription_uuids_cache.set(attribute_subscription_id, key)
+    return attribute_ids
+
+
+def store_values(values):
+    """
+    Insert the given unsaved Value instances using as few database round trips as possible: batched multi-row
+    INSERTs, or a single COPY on PostgreSQL when the batch is large enough to make it worthwhile. Values for an
+    attribute and timestamp already stored, as when SenseHel retries a submission, are skipped, keeping the value
+    stored first, including values already moved to cold storage. The rollups and statistics are updated with the
+    inserted values only, in the same transaction. Return the inserted values.
+    """
+    with transaction.atomic():
+        new_values = without_cold_values(values)
+        if not has_unique_constraint():
+            new_values = without_stored_values(new_values)
+        if connection.vendor == 'postgresql' and len(new_values) >= settings.VALUES_COPY_THRESHOLD:
+            inserted = copy_values(new_values)
+        else:
+            inserted = insert_values(new_values)
+        update_rollups(inserted)
+        update_attribute_stats(inserted)
+        # Last, to be stamped as close as possible to the commit:
+        updated_at = touch_subscriptions(set(value.attribute_id for value in inserted))
+
+    values_by_subscription = {}
+    for value in inserted:
+        subscription_uuid = subscription_uuids_cache.get(value.attribute_id)
+        if subscription_uuid:
+            values_by_subscription.setdefault(subscription_uuid, []).append(value)
+    values_stored.send(sender=models.Value, values=inserted, duplicates=len(values) - len(inserted),
+                       values_by_subscription=values_by_subscription, updated_at=updated_at)
+    return inserted
+
+
+def value_columns():
+    """
+    Return the fields set on submitted values, and the SQL for inserting them while skipping duplicates and
+    returning the (id, attribute_id, timestamp) of the inserted rows.
+    """
+    qn = connection.ops.quote_name
+    fields = [models.Value._meta.get_field(name) for name in ['attribute', 'value', 'timestamp']]
+    columns = ', '.join(qn(field.column) for field in fields)
+    on_conflict = f'''
+        ON CONFLICT ({qn('attribute_id')}, {qn('timestamp')}) DO NOTHING''' if has_unique_constraint() else ''
+    on_conflict += f'''
+        RETURNING {qn('id')}, {qn('attribute_id')}, {qn('timestamp')}'''
+    return fields, columns, on_conflict
+
+
+@functools.lru_cache(maxsize=None)
+def has_unique_constraint():
+    """
+    Return whether the unique constraint on the attribute and timestamp of values, added by the migration
+    0010_unique_values once the deduplicate_values command has run, exists, as ON CONFLICT needs it. Checked once per
+    process, so that processes should be restarted after migrating.
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, models.Value._meta.db_table)
+    return any(constraint['unique'] and constraint['columns'] == ['attribute_id', 'timestamp']
+               for constraint in constraints.values())
+
+
+def without_stored_values(values):
+    """
+    Return the values, without those for an attribute and timestamp already stored or repeated among them: the
+    slower and racy way to skip duplicates, until the unique constraint exists.
+    """
+    unique = {}
+    for value in values:
+        unique.setdefault((value.attribute_id, value.timestamp), value)
+    keys = list(unique)
+    stored = set()
+    for i in range(0, len(keys), settings.VALUES_INSERT_BATCH_SIZE):
+        batch = keys[i:i + settings.VALUES_INSERT_BATCH_SIZE]
+        stored.update(models.Value.objects.filter(
+            attribute__in=set(attribute_id for attribute_id, _ in batch),
+            timestamp__in=set(timestamp for _, timestamp in batch)).values_list('attribute_id', 'timestamp'))
+    return [value for key, value in unique.items() if key not in stored]
+
+
+def without_cold_values(values):
+    """
+    Return the values, without those for an attribute and timestamp already in a ValueBlock: the unique constraint
+    on the Value table does not cover the values moved to cold storage.
+    """
+    # Only the values of days before the current UTC day are ever compressed, so that values just received need no
+    # lookups:
+    today = cold_storage.day_start(timezone.now().astimezone(timezone.utc).date())
+    old_values = [value for value in values if value.timestamp < today]
+    if not old_values:
+        return values
+
+    cold_until = dict(models.AttributeSubscription.objects
+                      .filter(id__in=set(value.attribute_id for value in old_values), cold_until__isnull=False)
+                      .values_list('id', 'cold_until'))
+    cold_values = [value for value in old_values
+                   if value.attribute_id in cold_until and value.timestamp < cold_until[value.attribute_id]]
+    if not cold_values:
+        return values
+
+    blocks = models.ValueBlock.objects.filter(
+        attribute__in=set(value.attribute_id for value in cold_values),
+        day__in=set(value.timestamp.astimezone(timezone.utc).date() for value in cold_values))
+    stored = set((attribute_id, timestamp) for attribute_id, data in blocks.values_list('attribute_id', 'data')
+                 for timestamp, _ in cold_storage.decode(data))
+    return [value for value in values if (value.attribute_id, value.timestamp) not in stored]
+
+
+def insert_values(values):
+    fields, columns, on_conflict = value_columns()
+    table = connection.ops.quote_name(models.Value._meta.db_table)
+    batch_size = min(settings.VALUES_INSERT_BATCH_SIZE, connection.ops.bulk_batch_size(fields, values) or 1)
+    rows = []
+    with connection.cursor() as cursor:
+        for i in range(0, len(values), batch_size):
+            batch = values[i:i + batch_size]
+            placeholders = ', '.join(['(%s, %s, %s)'] * len(batch))
+            cursor.execute(f'INSERT INTO {table} ({columns}) VALUES {placeholders} {on_conflict}', [
+                field.get_db_prep_save(getattr(value, field.attname), connection)
+                for value in batch for field in fields])
+            rows += cursor.fetchall()
+    return inserted_values(values, rows)
+
+
+def copy_values(values):
+    """
+    COPY the values into a temporary table, and insert those not already stored from there.
+    """
+    fields, columns, on_conflict = value_columns()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for value in values:
+        writer.writerow([field.get_db_prep_save(getattr(value, field.attname), connection) for field in fields])
+    buffer.seek(0)
+
+    table, temp_table = [connection.ops.quote_name(name) for name in [models.Value._meta.db_table, 'value_import']]
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMPORARY TABLE {temp_table} AS SELECT {columns} FROM {table} WITH NO DATA')
+        cursor.copy_expert(f'COPY {temp_table} ({columns}) FROM STDIN WITH CSV', buffer)
+        cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {temp_table} {on_conflict}')
+        rows = cursor.fetchall()
+        cursor.execute(f'DROP TABLE {temp_table}')
+    return inserted_values(values, rows)
+
+
+def inserted_values(values, rows):
+    """
+    Return the values matching the (id, attribute_id, timestamp) rows returned by an insert, with their ids set. Of
+    several values for the same attribute and timestamp, only the first one is returned.
+    """
+    ids = {}
+    for id, attribute_id, timestamp in rows:
+        if isinstance(timestamp, str):
+            timestamp = parse_datetime(timestamp)
+        if timezone.is_naive(timestamp):
+            # As returned by SQLite, which stores timestamps in UTC:
+            timestamp = timezone.make_aware(timestamp, timezone.utc)
+        ids[(attribute_id, timestamp)] = id
+
+    inserted = []
+    for value in values:
+        value.id = ids.pop((value.attribute_id, value.timestamp), None)
+        if value.id is not None:
+            inserted.append(value)
+    return inserted
+
+
+def truncate(timestamp, period):
+    timestamp = timezone.localtime(timestamp).replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0) if period == 'day' else timestamp
+
+
+def update_rollups(values):
+    for model in ROLLUP_MODELS:
+        buckets = {}
+        for value in values:
+            key = (value.attribute_id, truncate(value.timestamp, model.period))
+            count, sum_, min_, max_ = buckets.get(key, (0, 0, value.value, value.value))
+            buckets[key] = (count + 1, sum_ + value.value, min(min_, value.value), max(max_, value.value))
+        rows = [key + aggregates for key, aggregates in buckets.items()]
+        for i in range(0, len(rows), settings.VALUES_INSERT_BATCH_SIZE):
+            upsert_rollups(model, rows[i:i + settings.VALUES_INSERT_BATCH_SIZE])
+
+
+def update_attribute_stats(values):
+    """
+    Add the given values to the statistics stored on their attribute subscriptions.
+    """
+    stats = {}
+    for value in values:
+        count, sum_, min_, max_ = stats.get(value.attribute_id, (0, 0, value.value, value.value))
+        stats[value.attribute_id] = (count + 1, sum_ + value.value, min(min_, value.value), max(max_, value.value))
+
+    # Update in a consistent order to avoid deadlocks between concurrent submissions:
+    for attribute_id, (count, sum_, min_, max_) in sorted(stats.items()):
+        # Cast, as SQLite would otherwise compare the decimals passed as strings to the stored numbers as text:
+        min_, max_ = [Cast(Value(value), models.Value._meta.get_field('value')) for value in (min_, max_)]
+        models.AttributeSubscription.objects.filter(id=attribute_id).update(
+            values_count=F('values_count') + count,
+            values_sum=F('values_sum') + sum_,
+            values_min=Least(Coalesce('values_min', min_), min_),
+            values_max=Greatest(Coalesce('values_max', max_), max_))
+
+
+def touch_subscriptions(attribute_ids):
+    """
+    Mark the subscriptions of the given attribute subscriptions as updated, invalidating responses cached by clients
+    through conditional requests, and cached previews. Subscription.updated_at never moves backwards, should a
+    transaction stamped later have committed first. Return a dict mapping the UUIDs of the subscriptions to their
+    (previous, new) updated_at, as cached previews are only updated in place from the previous one.
+    """
+    # Locked, in a consistent order, to read the updated_at committed by a concurrent transaction touching them first:
+    previous = models.Subscription.all_objects.select_for_update().filter(
+        id__in=models.AttributeSubscription.objects.filter(id__in=attribute_ids).values('subscription_id'))
+    previous = list(previous.order_by('id').values_list('id', 'uuid', 'updated_at'))
+    if not previous:
+        return {}
+
+    updated_at = timezone.now()
+    field = models.Subscription._meta.get_field('updated_at')
+    models.Subscription.all_objects.filter(id__in=[id for id, _, _ in previous]).update(
+        updated_at=Greatest('updated_at', Value(updated_at, output_field=field)))
+    return {str(subscription_uuid): (previous_updated_at, max(previous_updated_at, updated_at))
+            for _, subscription_uuid, previous_updated_at in previous}
+
+
+def upsert_rollups(model, rows):
+    """
+    Add the given (attribute_id, bucket, count, sum, min, max) aggregates to the rollup rows of the model, creating
+    the rows for buckets not seen before.
+    """
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = [qn(column) for column in ['attribute_id', 'bucket', 'count', 'sum', 'min', 'max']]
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+    count, sum_, min_, max_ = columns[2:]
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+
+    sql = f'''
+        INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders}
+        ON CONFLICT ({columns[0]}, {columns[1]}) DO UPDATE SET
+            {count} = {table}.{count} + EXCLUDED.{count},
+            {sum_} = {table}.{sum_} + EXCLUDED.{sum_},
+            {min_} = {least}({table}.{min_}, EXCLUDED.{min_}),
+            {max_} = {greatest}({table}.{max_}, EXCLUDED.{max_})'''
+
+    bucket_field = model._meta.get_field('bucket')
+    params = []
+    for attribute_id, bucket, *aggregates in rows:
+        params += [attribute_id, bucket_field.get_db_prep_value(bucket, connection)] + aggregates
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
@@ -0,0 +1,167 @@
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from sensehel_logs_service import models
+
+SCENARIOS = ['submit', 'retrieve', 'admin', 'unsubscribe']
+
+
+class Command(BaseCommand):
+    help = ('Benchmark data submission, subscription retrieve, admin changelists and unsubscribe through the full '
+            'Django request stack at a given concurrency, against the configured database, and report throughput, '
+            'latency percentiles and query counts. Uses the subscriptions created by generate_data; submits '
+            'values and deletes subscriptions, so not for production databases.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f'Comma separated scenarios to run, among {", ".join(SCENARIOS)}.')
+        parser.add_argument('--requests', type=int, default=200, help='Number of requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent clients.')
+        parser.add_argument('--values', type=int, default=60, help='Number of values per attribute per submission.')
+        parser.add_argument('--hours', type=float, default=24,
+                            help='Time period of the values fetched by retrieve, downsampled as by the UI.')
+        parser.add_argument('--output', help='Also write the results as JSON to this file, for comparing runs.')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+        self.options = options
+        self.subscriptions = list(models.Subscription.objects.filter(attributes__isnull=False).distinct()
+                                  .values_list('uuid', flat=True))
+        if not self.subscriptions and set(scenarios) & {'submit', 'retrieve'}:
+            raise CommandError('No subscriptions to benchmark with; run generate_data first.')
+        # A token of its own, valid only while benchmarking:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.token = str(token.token)
+
+        results = {}
+        try:
+            for scenario in scenarios:
+                requests = getattr(self, f'{scenario}_requests')()
+                results[scenario] = self.run(requests)
+                self.report(scenario, results[scenario])
+        finally:
+            token.delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def submit_requests(self):
+        attribute_ids = dict((str(subscription_uuid), []) for subscription_uuid in self.subscriptions)
+        for subscription_uuid, attribute_id in models.AttributeSubscription.objects\
+                .filter(subscription__uuid__in=self.subscriptions).values_list('subscription__uuid', 'attribute_id'):
+            attribute_ids[str(subscription_uuid)].append(attribute_id)
+
+        def submit(client):
+            subscription_uuid = random.choice(self.subscriptions)
+            now = timezone.now()
+            return client.post(reverse('values-create'), {
+                'uuid': str(subscription_uuid),
+                'auth_token': self.token,
+                'values': [{'attribute': attribute_id,
+                            'timestamp': (now - timedelta(seconds=i)).isoformat(),
+                            'value': round(random.uniform(15, 25), 1)}
+                           for attribute_id in attribute_ids[str(subscription_uuid)]
+                           for i in range(self.options['values'])]
+            }, content_type='application/json')
+        return [submit] * self.options['requests']
+
+    def retrieve_requests(self):
+        def retrieve(client):
+            since = timezone.now() - timedelta(hours=self.options['hours'])
+            return client.get(reverse('subscription-detail', kwargs={'uuid': random.choice(self.subscriptions)}),
+                              {'values_timestamp_gt': since.isoformat(), 'max_points': 1920})
+        return [retrieve] * self.options['requests']
+
+    def admin_requests(self):
+        urls = [reverse('admin:sensehel_logs_service_value_changelist'),
+                reverse('admin:sensehel_logs_service_attributesubscription_changelist'),
+                reverse('admin:sensehel_logs_service_subscription_changelist')]
+        self.admin_user = User.objects.filter(is_superuser=True).first() or \
+            User.objects.create_superuser('benchmark', 'benchmark@example.com', str(uuid.uuid4()))
+        return [lambda client, url=urls[i % len(urls)]: client.get(url) for i in range(self.options['requests'])]
+
+    def unsubscribe_requests(self):
+        # Fresh subscriptions, each with a day of values, to be unsubscribed:
+        attribute_type = models.SensorAttribute.objects.get_or_create(
+            uri='http://urn.fi/URN:NBN:fi:au:ucum:r73', defaults={'description': 'temperature'})[0]
+        now = timezone.now()
+        subscriptions = []
+        for i in range(self.options['requests']):
+            subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+            attr = subscription.attributes.create(attribute_id=1, attribute_type=attribute_type)
+            models.Value.objects.bulk_create([models.Value(attribute=attr, timestamp=now - timedelta(minutes=j),
+                                                           value=20) for j in range(1440)])
+            subscriptions.append(str(subscription.uuid))
+        return [lambda client, subscription_uuid=subscription_uuid: client.post(
+            reverse('subscription-unsubscribe'), {'uuid': subscription_uuid, 'auth_token': self.token})
+            for subscription_uuid in subscriptions]
+
+    def run(self, requests):
+        """
+        Perform the requests from concurrent clients, each in a thread of its own with its own database connection.
+        """
+        queue = list(reversed(requests))
+        lock = threading.Lock()
+        samples = []
+
+        def worker():
+            client = Client(HTTP_HOST='localhost')
+            if getattr(self, 'admin_user', None):
+                client.force_login(self.admin_user)
+            try:
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        request = queue.pop()
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        response = request(client)
+                        duration = time.perf_counter() - start
+                    samples.append((duration, response.status_code, len(queries),
+                                    sum(float(query['time']) for query in queries)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for i in range(self.options['concurrency'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        durations = np.array([sample[0] for sample in samples]) * 1000
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for sample in samples if sample[1] >= 400),
+            'throughput': len(samples) / elapsed,
+            'latency_ms': dict((f'p{p}', float(np.percentile(durations, p))) for p in [50, 90, 99]),
+            'max_latency_ms': float(durations.max()),
+            'queries': float(np.mean([sample[2] for sample in samples])),
+            'query_time_ms': float(np.mean([sample[3] for sample in samples])) * 1000,
+        }
+
+    def report(self, scenario, result):
+        latency = ', '.join(f'{p} {ms:.1f}' for p, ms in result['latency_ms'].items())
+        self.stdout.write(
+            f'{scenario:>12}: {result["requests"]} requests, {result["errors"]} errors, '
+            f'{result["throughput"]:.1f} req/s; latency ms {latency}, max {result["max_latency_ms"]:.1f}; '
+            f'{result["queries"]:.1f} queries, {result["query_time_ms"]:.1f} ms per request')
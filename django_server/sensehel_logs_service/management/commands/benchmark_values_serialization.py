@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from sensehel_logs_service import models
+from sensehel_logs_service.rest.serializers import ValueSerializer, serialize_values
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of serializing values to JSON through ValueSerializer against the '
+            'fast path used by subscription retrieve. Does not touch the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=100000, help='Number of values to serialize.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of runs; the fastest one is reported.')
+
+    def handle(self, *args, **options):
+        start = timezone.now()
+        rows = [(start + timedelta(minutes=i), Decimal(200 + i % 50) / 10) for i in range(options['points'])]
+        instances = [models.Value(timestamp=timestamp, value=value) for timestamp, value in rows]
+        renderer = JSONRenderer()
+
+        timings = {
+            'ValueSerializer': self.time(options['repeat'], lambda: renderer.render(
+                ValueSerializer(instances, many=True).data)),
+            'serialize_values': self.time(options['repeat'], lambda: renderer.render(
+                serialize_values(rows)))
+        }
+
+        for name, seconds in timings.items():
+            self.stdout.write(f'{name:>20}: {seconds:.3f}s, {options["points"] / seconds:,.0f} values/s')
+        self.stdout.write(f'Speedup: {timings["ValueSerializer"] / timings["serialize_values"]:.1f}x')
+
+    def time(self, repeat, fn):
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sensehel_logs_service import models
+from sensehel_logs_service.cold_storage import compress_day, day_start
+
+
+class Command(BaseCommand):
+    help = ('Move values older than VALUES_HOT_DAYS days to cold storage, compressed into one block per attribute '
+            'subscription and UTC day, one day per transaction. Safe to interrupt and rerun.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.VALUES_HOT_DAYS,
+                            help='Compress values of days ending at least this many days ago.')
+        parser.add_argument('--subscription', help='Only compress the values of the subscription with this UUID.')
+
+    def handle(self, *args, **options):
+        cutoff = day_start((timezone.now() - timedelta(days=options['days'])).astimezone(timezone.utc).date())
+        attributes = models.AttributeSubscription.objects.order_by('id')
+        if options['subscription']:
+            attributes = attributes.filter(subscription__uuid=options['subscription'])
+
+        for attribute in attributes.iterator():
+            moved = 0
+            while True:
+                oldest = attribute.values.filter(timestamp__lt=cutoff).order_by('timestamp')\
+                    .values_list('timestamp', flat=True).first()
+                if oldest is None:
+                    break
+                moved += compress_day(attribute, oldest.astimezone(timezone.utc).date())
+            if moved:
+                self.stdout.write(f'Compressed {moved} values of {attribute}')
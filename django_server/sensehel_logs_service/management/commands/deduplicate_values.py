@@ -0,0 +1,51 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from sensehel_logs_service import models
+from sensehel_logs_service.ingestion import touch_subscriptions
+
+
+class Command(BaseCommand):
+    help = ('Delete values stored more than once for the same attribute and timestamp, keeping the first one, in '
+            'small batches, then rebuild the rollups and statistics of the affected subscriptions. Required before '
+            'migration 0010_unique_values. If interrupted, rerun with rebuild_rollups and rebuild_attribute_stats.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of consecutive value ids checked per transaction.')
+
+    def handle(self, *args, **options):
+        bounds = models.Value.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            return
+
+        attribute_ids, total = set(), 0
+        for start in range(bounds['first'], bounds['last'] + 1, options['batch_size']):
+            deleted = self.delete_batch(start, start + options['batch_size'])
+            if deleted:
+                attribute_ids.update(deleted)
+                total += len(deleted)
+                self.stdout.write(f'Deleted {total} duplicate values, up to id {start + options["batch_size"] - 1}')
+
+        subscriptions = models.Subscription.all_objects.filter(attributes__id__in=attribute_ids).distinct()
+        for subscription in subscriptions.order_by('id'):
+            for command in ['rebuild_rollups', 'rebuild_attribute_stats']:
+                call_command(command, subscription=str(subscription.uuid), stdout=self.stdout)
+        touch_subscriptions(attribute_ids)
+
+    def delete_batch(self, start, end):
+        """
+        Delete the values with ids in [start, end) for which a value with a lower id is stored for the same attribute
+        and timestamp, in a transaction of its own. Return the attribute ids of the deleted values.
+        """
+        table = connection.ops.quote_name(models.Value._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'''
+                DELETE FROM {table} WHERE id IN (
+                    SELECT v.id FROM {table} v WHERE v.id >= %s AND v.id < %s AND EXISTS (
+                        SELECT 1 FROM {table} o
+                        WHERE o.attribute_id = v.attribute_id AND o.timestamp = v.timestamp AND o.id < v.id))
+                RETURNING attribute_id''', [start, end])
+            return [attribute_id for attribute_id, in cursor.fetchall()]
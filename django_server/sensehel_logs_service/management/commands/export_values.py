@@ -0,0 +1,112 @@
+import sys
+from io import StringIO
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from sensehel_logs_service import bulk_transfer, cold_storage, models
+
+
+class Command(BaseCommand):
+    help = ('Export the values of a subscription to an NDJSON or CSV file, for import_values, in batches read by '
+            'attribute and timestamp: with COPY on PostgreSQL, except for values in cold storage. With --state-file '
+            'an interrupted export resumes after the last written batch. See sensehel_logs_service.bulk_transfer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write, or - for standard output.')
+        parser.add_argument('--subscription', required=True, help='UUID of the subscription to export.')
+        parser.add_argument('--format', choices=bulk_transfer.FORMATS,
+                            help='File format; by default csv for .csv files, ndjson otherwise.')
+        parser.add_argument('--attribute', type=int, help='Only export the values of the attribute with this id.')
+        parser.add_argument('--from', type=bulk_transfer.parse_timestamp, help='Only export values since this time.')
+        parser.add_argument('--to', type=bulk_transfer.parse_timestamp, help='Only export values before this time.')
+        parser.add_argument('--batch-size', type=int, default=100000, help='Number of values read at a time.')
+        parser.add_argument('--state-file', help='File to save progress in, and to resume from.')
+
+    def handle(self, *args, **options):
+        subscription = models.Subscription.objects.filter(uuid=options['subscription']).first()
+        if subscription is None:
+            raise CommandError(f'Unknown subscription: {options["subscription"]}')
+        attributes = subscription.attributes.order_by('id')
+        if options['attribute'] is not None:
+            attributes = attributes.filter(attribute_id=options['attribute'])
+        self.file_format = bulk_transfer.guess_format(options['path'], options['format'])
+        state = bulk_transfer.load_state(options['state_file'])
+
+        if options['path'] == '-':
+            out = sys.stdout
+        else:
+            out = open(options['path'], 'a' if state else 'w', newline='')
+        try:
+            if not state and self.file_format == 'csv':
+                out.write(','.join(bulk_transfer.CSV_HEADER) + '\n')
+            state = state or {'attribute': None, 'timestamp': None, 'exported': 0}
+
+            for attribute in attributes:
+                if state['attribute'] is not None and attribute.id < state['attribute']:
+                    continue
+                resumed = attribute.id == state['attribute']
+                after = bulk_transfer.parse_timestamp(state['timestamp']) if resumed else None
+                while True:
+                    lines, count = self.read_batch(attribute, after, options['from'], options['to'],
+                                                   options['batch_size'])
+                    if not count:
+                        break
+                    out.write(lines)
+                    out.flush()
+                    after = bulk_transfer.last_timestamp(lines, self.file_format)
+                    state = {'attribute': attribute.id, 'timestamp': after.isoformat(),
+                             'exported': state['exported'] + count}
+                    bulk_transfer.save_state(options['state_file'], state)
+                    self.stderr.write(f'{state["exported"]} values exported')
+                    if count < options['batch_size']:
+                        break
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    def read_batch(self, attribute, after, since, until, limit):
+        """
+        Return at most `limit` values of the attribute subscription, in chronological order after the `after`
+        timestamp if given, as file lines, along with their number.
+        """
+        values = models.Value.objects.filter(attribute=attribute).order_by('timestamp')
+        if after:
+            values = values.filter(timestamp__gt=after)
+        if since:
+            values = values.filter(timestamp__gte=since)
+        if until:
+            values = values.filter(timestamp__lt=until)
+
+        rows = values.values_list('timestamp', 'value')[:limit]
+        in_cold_storage = attribute.cold_until and not (after and after >= attribute.cold_until)
+        if connection.vendor == 'postgresql' and not in_cold_storage:
+            return self.copy_batch(attribute.attribute_id, rows)
+
+        rows = cold_storage.with_cold_rows(
+            ((attribute.id, timestamp, value) for timestamp, value in rows), [attribute], gt=after, gte=since, lt=until)
+        rows = [(attribute.attribute_id, timestamp, value) for _, timestamp, value in islice(rows, limit)]
+        return bulk_transfer.format_rows(rows, self.file_format), len(rows)
+
+    def copy_batch(self, attribute_id, rows):
+        """
+        Read the (timestamp, value) rows of the queryset with COPY, formatted by PostgreSQL as file lines. NDJSON
+        lines are copied as a single CSV column, as the text format would escape the backslashes in them.
+        """
+        attribute_id = int(attribute_id)
+        if self.file_format == 'csv':
+            columns = f"{attribute_id}, to_json(timestamp) #>> '{{}}', value"
+            options = 'FORMAT csv'
+        else:
+            columns = f"json_build_object('attribute', {attribute_id}, 'timestamp', timestamp, 'value', value)"
+            # Control characters never found in the JSON as delimiter and quote, so that it is written as is:
+            options = "FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01'"
+        sql, params = rows.query.sql_with_params()
+        buffer = StringIO()
+        with connection.cursor() as cursor:
+            query = cursor.mogrify(
+                f'SELECT {columns} FROM ({sql}) AS batch(timestamp, value) ORDER BY timestamp', params)
+            cursor.copy_expert(f'COPY ({query.decode()}) TO STDOUT WITH ({options})', buffer)
+        lines = buffer.getvalue()
+        return lines, lines.count('\n')
@@ -0,0 +1,61 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sensehel_logs_service import ingestion, models
+
+# (description, uri, mean, daily amplitude, noise) of the generated sensor attributes:
+ATTRIBUTE_TYPES = [
+    ('temperature', 'http://urn.fi/URN:NBN:fi:au:ucum:r73', 21, 2, 0.2),
+    ('humidity', 'http://urn.fi/URN:NBN:fi:au:ucum:r1', 40, 8, 1),
+    ('co2', 'http://urn.fi/URN:NBN:fi:au:ucum:r228', 600, 250, 20),
+    ('illuminance', 'http://urn.fi/URN:NBN:fi:au:ucum:r91', 200, 200, 10),
+]
+
+
+class Command(BaseCommand):
+    help = ('Generate subscriptions with synthetic sensor data for load testing, inserted through the regular bulk '
+            'ingestion path. Not for production databases.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=10, help='Number of subscriptions to create.')
+        parser.add_argument('--attributes', type=int, default=2, help='Number of attributes per subscription.')
+        parser.add_argument('--points', type=int, default=10080, help='Number of values per attribute.')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between consecutive values.')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Number of values stored at a time.')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for repeatable data.')
+
+    def handle(self, *args, **options):
+        random = np.random.default_rng(options['seed'])
+        attribute_types = [
+            models.SensorAttribute.objects.get_or_create(uri=uri, defaults={'description': description})[0]
+            for description, uri, *_ in ATTRIBUTE_TYPES]
+        end = timezone.now()
+        offsets = np.arange(-options['points'] + 1, 1) * options['interval']
+
+        for i in range(options['subscriptions']):
+            subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+            for j in range(options['attributes']):
+                attribute_type = attribute_types[j % len(attribute_types)]
+                attr = subscription.attributes.create(attribute_id=j + 1, attribute_type=attribute_type)
+                values = self.series(random, offsets, end, *ATTRIBUTE_TYPES[j % len(ATTRIBUTE_TYPES)][2:])
+                for start in range(0, len(offsets), options['batch_size']):
+                    ingestion.store_values([
+                        models.Value(attribute=attr, timestamp=end + timedelta(seconds=offset), value=Decimal(value))
+                        for offset, value in zip(offsets[start:start + options['batch_size']].tolist(),
+                                                 values[start:start + options['batch_size']])])
+            self.stdout.write(f'{i + 1}/{options["subscriptions"]}: {subscription.uuid}')
+
+    def series(self, random, offsets, end, mean, amplitude, noise):
+        """
+        Daily cycle peaking in the afternoon, with a random walk and measurement noise, rounded to 0.1.
+        """
+        seconds_of_day = (end.timestamp() + offsets) % 86400
+        daily = amplitude * np.sin(2 * np.pi * (seconds_of_day - 9 * 3600) / 86400)
+        walk = np.cumsum(random.normal(0, noise / 10, len(offsets)))
+        values = mean + daily + walk + random.normal(0, noise, len(offsets))
+        return ['%.1f' % value for value in values]
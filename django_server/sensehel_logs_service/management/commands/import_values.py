@@ -0,0 +1,68 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sensehel_logs_service import bulk_transfer, ingestion, models
+
+
+class Command(BaseCommand):
+    help = ('Import values into a subscription from an NDJSON or CSV file, as written by export_values, streaming '
+            'the file in batches stored through the regular bulk ingestion path: COPY on PostgreSQL. Values already '
+            'stored are skipped, so an interrupted import can safely be rerun; with --state-file it resumes from '
+            'the last stored batch. See sensehel_logs_service.bulk_transfer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import.')
+        parser.add_argument('--subscription', required=True, help='UUID of the subscription to import into.')
+        parser.add_argument('--format', choices=bulk_transfer.FORMATS,
+                            help='File format; by default csv for .csv files, ndjson otherwise.')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Number of values stored at a time.')
+        parser.add_argument('--state-file', help='File to save progress in, and to resume from.')
+
+    def handle(self, *args, **options):
+        attribute_ids = ingestion.get_attribute_ids(options['subscription'])
+        if attribute_ids is None:
+            raise CommandError(f'Unknown subscription: {options["subscription"]}')
+        file_format = bulk_transfer.guess_format(options['path'], options['format'])
+        state = bulk_transfer.load_state(options['state_file']) or \
+            {'offset': 0, 'lines': 0, 'imported': 0, 'duplicates': 0}
+
+        # Read as bytes, to keep track of the offset to resume from:
+        with open(options['path'], 'rb') as f:
+            columns = bulk_transfer.CSV_HEADER
+            if file_format == 'csv':
+                header = f.readline()
+                columns = next(csv.reader([header.decode()]))
+                if set(bulk_transfer.CSV_HEADER).difference(columns):
+                    raise CommandError(f'Expected the columns {", ".join(bulk_transfer.CSV_HEADER)}')
+                state['offset'] = max(state['offset'], len(header))
+            f.seek(state['offset'])
+
+            batch = []
+            for line in f:
+                state['offset'] += len(line)
+                state['lines'] += 1
+                text = line.decode().strip()
+                if not text:
+                    continue
+                try:
+                    attribute_id, timestamp, value = bulk_transfer.parse_record(text, file_format, columns)
+                except ValueError as e:
+                    raise CommandError(f'Line {state["lines"]}: {e}')
+                if attribute_id not in attribute_ids:
+                    raise CommandError(f'Line {state["lines"]}: unknown attribute {attribute_id}')
+                batch.append(models.Value(attribute_id=attribute_ids[attribute_id], timestamp=timestamp, value=value))
+                if len(batch) >= options['batch_size']:
+                    self.store(batch, state, options['state_file'])
+                    batch = []
+            self.store(batch, state, options['state_file'])
+
+    def store(self, batch, state, state_file):
+        # Values stored but not recorded in the state file, if interrupted in between, are skipped as duplicates on
+        # resuming:
+        inserted = ingestion.store_values(batch) if batch else []
+        state['imported'] += len(inserted)
+        state['duplicates'] += len(batch) - len(inserted)
+        bulk_transfer.save_state(state_file, state)
+        self.stdout.write(f'{state["lines"]} lines read: {state["imported"]} values imported, '
+                          f'{state["duplicates"]} duplicates skipped')
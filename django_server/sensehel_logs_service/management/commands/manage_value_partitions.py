@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from sensehel_logs_service import partitions
+
+
+class Command(BaseCommand):
+    help = ('Create the upcoming monthly partitions of the value table and remove those past the retention period. '
+            'Run on its own, e.g. from cron, not from code that has written values in the same transaction.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The value table is only partitioned on PostgreSQL.')
+
+        for name in partitions.ensure_partitions(settings.VALUES_PARTITION_MONTHS_AHEAD):
+            self.stdout.write(f'Created partition {name}')
+
+        if settings.VALUES_RETENTION_MONTHS:
+            cutoff = partitions.month_start(timezone.now(), -settings.VALUES_RETENTION_MONTHS)
+            drop = settings.VALUES_RETENTION_DROP
+            for name in partitions.remove_partitions_before(cutoff, drop=drop):
+                self.stdout.write(f'{"Dropped" if drop else "Detached"} partition {name}')
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from sensehel_logs_service import models
+from sensehel_logs_service.ingestion import ROLLUP_MODELS
+
+
+class Command(BaseCommand):
+    help = 'Delete unsubscribed subscriptions along with their values, in small batches. Safe to interrupt and rerun.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, checking for new unsubscriptions every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds to sleep between checks with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            for subscription in models.Subscription.all_objects.filter(deleted=True).order_by('id'):
+                self.purge(subscription)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def purge(self, subscription):
+        attribute_ids = list(subscription.attributes.values_list('id', flat=True))
+        for model in [models.Value, models.ValueBlock] + ROLLUP_MODELS:
+            total = 0
+            while True:
+                deleted = self.delete_batch(model, attribute_ids)
+                if not deleted:
+                    break
+                total += deleted
+                self.stdout.write(f'{subscription}: deleted {total} {model._meta.verbose_name_plural}')
+
+        # Nothing is left to cascade to but the attribute subscriptions:
+        subscription.delete()
+        self.stdout.write(f'{subscription}: purged')
+
+    def delete_batch(self, model, attribute_ids):
+        """
+        Delete at most SUBSCRIPTION_PURGE_BATCH_SIZE rows of the model belonging to the given attribute
+        subscriptions, in a transaction of its own. Return the number of rows deleted.
+        """
+        if not attribute_ids:
+            return 0
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        placeholders = ', '.join(['%s'] * len(attribute_ids))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'''
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE attribute_id IN ({placeholders}) LIMIT %s)''',
+                           attribute_ids + [settings.SUBSCRIPTION_PURGE_BATCH_SIZE])
+            return cursor.rowcount
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum, Min, Max
+
+from sensehel_logs_service import models
+
+
+class Command(BaseCommand):
+    help = 'Recompute the value statistics stored on attribute subscriptions from the raw values.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscription', help='Only rebuild the statistics of the subscription with this UUID.')
+
+    def handle(self, *args, **options):
+        attributes = models.AttributeSubscription.objects.order_by('id')
+        if options['subscription']:
+            attributes = attributes.filter(subscription__uuid=options['subscription'])
+
+        for attribute in attributes.iterator():
+            stats = attribute.values.order_by().aggregate(
+                values_count=Count('id'), values_sum=Sum('value'), values_min=Min('value'), values_max=Max('value'))
+            stats['values_sum'] = stats['values_sum'] or 0
+            models.AttributeSubscription.objects.filter(id=attribute.id).update(**stats)
+            self.stdout.write(f'Rebuilt statistics for {attribute}')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum, Min, Max
+from django.db.models.functions import Trunc
+
+from sensehel_logs_service import models
+from sensehel_logs_service.ingestion import ROLLUP_MODELS
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily value rollups from the raw values.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscription', help='Only rebuild the rollups of the subscription with this UUID.')
+
+    def handle(self, *args, **options):
+        attributes = models.AttributeSubscription.objects.order_by('id')
+        if options['subscription']:
+            attributes = attributes.filter(subscription__uuid=options['subscription'])
+
+        for attribute in attributes.iterator():
+            with transaction.atomic():
+                for model in ROLLUP_MODELS:
+                    model.objects.filter(attribute=attribute).delete()
+                    rows = attribute.values.order_by()\
+                        .annotate(bucket=Trunc('timestamp', model.period)).values('bucket')\
+                        .annotate(count=Count('id'), sum=Sum('value'), min=Min('value'), max=Max('value'))
+                    model.objects.bulk_create([model(attribute=attribute, **row) for row in rows], batch_size=1000)
+            self.stdout.write(f'Rebuilt rollups for {attribute}')
@@ -0,0 +1,184 @@
+"""
+In-process request metrics, exposed in the Prometheus text format by metrics_view.
+
+MetricsMiddleware records, per view, the number of requests by method and status code, a histogram of their
+durations, the number and duration of the database queries they ran and the size of request and response bodies.
+Queries are counted by a database execute wrapper installed on each connection, attributed to the request through a
+context variable so that queries run in other threads by the async views are included.
+
+Metrics are kept per process: with several worker processes, each scrape sees the metrics of one of them.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+from sensehel_logs_service import write_behind
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# [queries, query seconds] of the request being handled:
+current_queries = contextvars.ContextVar('current_queries', default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.durations = {}
+            self.counters = {}
+            self.values_ingested = 0
+            self.values_duplicate = 0
+
+    def observe_request(self, view, method, status, duration, queries, query_seconds, request_bytes,
+                        response_bytes):
+        with self.lock:
+            key = (view, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            buckets, count, total = self.durations.get(view, ([0] * len(DURATION_BUCKETS), 0, 0))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+            self.durations[view] = (buckets, count + 1, total + duration)
+
+            for name, value in [('db_queries', queries), ('db_query_seconds', query_seconds),
+                                ('request_bytes', request_bytes), ('response_bytes', response_bytes)]:
+                self.counters[(name, view)] = self.counters.get((name, view), 0) + value
+
+    def observe_values_ingested(self, count, duplicates=0):
+        with self.lock:
+            self.values_ingested += count
+            self.values_duplicate += duplicates
+
+    def render(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            """
+            Add a metric, given its samples as (name suffix, labels, value).
+            """
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}'])
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f'{name}{suffix}{{{label_text}}} {value}' if label_text else f'{name}{suffix} {value}')
+
+        with self.lock:
+            metric('sensehel_http_requests_total', 'counter', 'Requests handled, by view, method and status.',
+                   [('', {'view': view, 'method': method, 'status': status}, count)
+                    for (view, method, status), count in sorted(self.requests.items())])
+
+            samples = []
+            for view, (buckets, count, total) in sorted(self.durations.items()):
+                samples += [('_bucket', {'view': view, 'le': str(bound)}, buckets[i])
+                            for i, bound in enumerate(DURATION_BUCKETS)]
+                samples += [('_bucket', {'view': view, 'le': '+Inf'}, count),
+                            ('_sum', {'view': view}, total),
+                            ('_count', {'view': view}, count)]
+            metric('sensehel_http_request_duration_seconds', 'histogram', 'Request durations, by view.', samples)
+
+            for name, help_text in [
+                    ('db_queries', 'Database queries run by requests, by view.'),
+                    ('db_query_seconds', 'Time spent in database queries by requests, by view.'),
+                    ('request_bytes', 'Size of request bodies, by view.'),
+                    ('response_bytes', 'Size of non-streaming response bodies, by view.')]:
+                metric(f'sensehel_{name}_total', 'counter', help_text,
+                       [('', {'view': view}, value) for (n, view), value in sorted(self.counters.items()) if n == name])
+
+            metric('sensehel_values_ingested_total', 'counter', 'Values stored.', [('', {}, self.values_ingested)])
+            metric('sensehel_values_duplicate_total', 'counter', 'Values skipped as already stored.',
+                   [('', {}, self.values_duplicate)])
+
+        stats = write_behind.buffer.stats()
+        metric('sensehel_write_behind_queue_depth', 'gauge', 'Values queued for writing.', [('', {}, stats['depth'])])
+        metric('sensehel_write_behind_values_total', 'counter', 'Values handled by the write-behind queue, by outcome.',
+               [('', {'outcome': outcome}, stats[outcome])
+                for outcome in ['enqueued', 'written', 'duplicates', 'retried', 'failed', 'rejected']])
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting the queries of the current request, see install_query_recorder.
+    """
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    # Keep the number of distinct labels small:
+    return 'admin' if match.namespace == 'admin' else match.view_name
+
+
+def observe(request, response, start, queries):
+    metrics.observe_request(
+        view_name(request), request.method, response.status_code, time.perf_counter() - start,
+        queries[0], queries[1], int(request.META.get('CONTENT_LENGTH') or 0),
+        0 if response.streaming else len(response.content))
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            start, queries = time.perf_counter(), [0, 0.0]
+            token = current_queries.set(queries)
+            try:
+                response = await get_response(request)
+            finally:
+                current_queries.reset(token)
+            observe(request, response, start, queries)
+            return response
+    else:
+        def middleware(request):
+            start, queries = time.perf_counter(), [0, 0.0]
+            token = current_queries.set(queries)
+            try:
+                response = get_response(request)
+            finally:
+                current_queries.reset(token)
+            observe(request, response, start, queries)
+            return response
+    return middleware
+
+
+def metrics_view(request):
+    """
+    Expose the metrics to Prometheus, authenticated with the bearer token METRICS_TOKEN, or to staff users.
+    """
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    token_ok = settings.METRICS_TOKEN and constant_time_compare(authorization, f'Bearer {settings.METRICS_TOKEN}')
+    if not (token_ok or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
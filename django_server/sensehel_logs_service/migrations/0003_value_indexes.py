@@ -0,0 +1,37 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_brin_index(apps, schema_editor):
+    # Values are appended in roughly chronological order, so a tiny BRIN index is enough to serve
+    # timestamp range scans over the whole table (e.g. the admin date hierarchy). PostgreSQL only.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS value_timestamp_brin ON sensehel_logs_service_value USING brin (timestamp)')
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS value_timestamp_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0002_auto_20200116_1212'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='value',
+            index=models.Index(fields=['attribute', 'timestamp'], name='value_attribute_timestamp'),
+        ),
+        migrations.AlterField(
+            model_name='value',
+            name='attribute',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='values', to='sensehel_logs_service.attributesubscription'),
+        ),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0003_value_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Start of the aggregated time period.')),
+                ('count', models.IntegerField()),
+                ('sum', models.DecimalField(decimal_places=1, max_digits=20)),
+                ('min', models.DecimalField(decimal_places=1, max_digits=10)),
+                ('max', models.DecimalField(decimal_places=1, max_digits=10)),
+                ('attribute', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sensehel_logs_service.attributesubscription')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'abstract': False,
+                'unique_together': {('attribute', 'bucket')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Start of the aggregated time period.')),
+                ('count', models.IntegerField()),
+                ('sum', models.DecimalField(decimal_places=1, max_digits=20)),
+                ('min', models.DecimalField(decimal_places=1, max_digits=10)),
+                ('max', models.DecimalField(decimal_places=1, max_digits=10)),
+                ('attribute', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sensehel_logs_service.attributesubscription')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'abstract': False,
+                'unique_together': {('attribute', 'bucket')},
+            },
+        ),
+    ]
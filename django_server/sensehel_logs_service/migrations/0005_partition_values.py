@@ -0,0 +1,58 @@
+from django.db import migrations
+
+TABLE = 'sensehel_logs_service_value'
+LEGACY = f'{TABLE}_legacy'
+
+
+def partition_values(apps, schema_editor):
+    """
+    Turn the value table into a table partitioned by month of timestamp, without copying any data: the existing
+    table becomes the partition for everything up to the end of the current month. Partitions for later months are
+    created by the manage_value_partitions management command; values outside of all partitions end up in a
+    default partition. PostgreSQL only; elsewhere the table is left as is.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [TABLE])
+        pkey = cursor.fetchone()[0]
+        cursor.execute("SELECT date_trunc('month', now() AT TIME ZONE 'UTC') + interval '1 month'")
+        legacy_end = cursor.fetchone()[0]
+
+    # Free the names of the table, its primary key and its indexes for the partitioned table:
+    execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY}')
+    execute(f'ALTER TABLE {LEGACY} RENAME CONSTRAINT {pkey} TO {LEGACY}_pkey')
+    execute('ALTER INDEX value_attribute_timestamp RENAME TO value_attribute_timestamp_legacy')
+    execute('ALTER INDEX IF EXISTS value_timestamp_brin RENAME TO value_timestamp_brin_legacy')
+
+    # The partition key must be part of the primary key; the ORM keeps using id alone.
+    execute(f'''
+        CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, PRIMARY KEY (id, timestamp))
+        PARTITION BY RANGE (timestamp)''')
+    execute(f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+    execute(f'''
+        ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_attribute_id_fk
+        FOREIGN KEY (attribute_id) REFERENCES sensehel_logs_service_attributesubscription (id)
+        DEFERRABLE INITIALLY DEFERRED''')
+    execute(f'CREATE INDEX value_attribute_timestamp ON {TABLE} (attribute_id, timestamp)')
+    execute(f'CREATE INDEX value_timestamp_brin ON {TABLE} USING brin (timestamp)')
+
+    # A partition must have the primary key of the partitioned table:
+    execute(f'ALTER TABLE {LEGACY} DROP CONSTRAINT {LEGACY}_pkey')
+    execute(f'ALTER TABLE {LEGACY} ADD CONSTRAINT {LEGACY}_pkey PRIMARY KEY (id, timestamp)')
+    execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY} FOR VALUES FROM (MINVALUE) TO (%s)', [legacy_end])
+    execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0004_rollups'),
+    ]
+
+    operations = [
+        # Reversing leaves the table partitioned, which is transparent to the ORM:
+        migrations.RunPython(partition_values, migrations.RunPython.noop),
+    ]
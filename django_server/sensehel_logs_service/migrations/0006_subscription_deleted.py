@@ -0,0 +1,30 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:52
+
+from django.db import migrations, models
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0005_partition_values'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'base_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelManagers(
+            name='subscription',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='deleted',
+            field=models.BooleanField(default=False, help_text='Unsubscribed; hidden everywhere until purged by the purge_subscriptions command.'),
+        ),
+    ]
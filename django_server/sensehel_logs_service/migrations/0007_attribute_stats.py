@@ -0,0 +1,33 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0006_subscription_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attributesubscription',
+            name='values_count',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attributesubscription',
+            name='values_max',
+            field=models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='attributesubscription',
+            name='values_min',
+            field=models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='attributesubscription',
+            name='values_sum',
+            field=models.DecimalField(decimal_places=1, default=0, max_digits=20),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.1.13 on 2026-10-18 08:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0007_attribute_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Last time values were received or attributes changed for the subscription.'),
+        ),
+    ]
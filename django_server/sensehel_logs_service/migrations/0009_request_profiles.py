@@ -0,0 +1,36 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sensehel_logs_service', '0008_subscription_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.TextField()),
+                ('status_code', models.IntegerField()),
+                ('duration', models.FloatField(help_text='Seconds.')),
+                ('query_count', models.IntegerField()),
+                ('query_time', models.FloatField(help_text='Seconds.')),
+                ('queries', models.JSONField(help_text='SQL timeline: start and duration in milliseconds, and statement.')),
+                ('stats', models.TextField(help_text='cProfile statistics, by cumulative time.')),
+                ('profile', models.BinaryField(help_text='Raw cProfile data, as written by pstats.Stats.dump_stats.')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
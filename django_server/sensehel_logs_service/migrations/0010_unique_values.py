@@ -0,0 +1,38 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+
+def check_duplicates(apps, schema_editor):
+    """
+    Refuse to migrate while values are stored more than once for the same attribute and timestamp. Those are
+    removed by the deduplicate_values management command, which also corrects the rollups and statistics. Until
+    then, new values are checked for duplicates without the constraint, see ingestion.has_unique_constraint; restart
+    the server processes after migrating.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT 1 FROM sensehel_logs_service_value
+            GROUP BY attribute_id, timestamp HAVING COUNT(*) > 1 LIMIT 1''')
+        if cursor.fetchone():
+            raise RuntimeError('Duplicate values found; run "manage.py deduplicate_values" before migrating.')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0009_request_profiles'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        # The unique index serves all lookups the removed index did:
+        migrations.AddConstraint(
+            model_name='value',
+            constraint=models.UniqueConstraint(fields=('attribute', 'timestamp'), name='value_attribute_timestamp_unique'),
+        ),
+        migrations.RemoveIndex(
+            model_name='value',
+            name='value_attribute_timestamp',
+        ),
+    ]
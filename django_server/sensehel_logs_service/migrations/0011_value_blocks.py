@@ -0,0 +1,33 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0010_unique_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attributesubscription',
+            name='cold_until',
+            field=models.DateTimeField(blank=True, help_text='End of the last day of values moved to cold storage, if any.', null=True),
+        ),
+        migrations.CreateModel(
+            name='ValueBlock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField()),
+                ('data', models.BinaryField()),
+                ('attribute', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='value_blocks', to='sensehel_logs_service.attributesubscription')),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('attribute', 'day')},
+            },
+        ),
+    ]
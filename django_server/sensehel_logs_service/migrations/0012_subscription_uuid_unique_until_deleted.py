@@ -0,0 +1,22 @@
+# Generated by Django 3.1.13 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensehel_logs_service', '0011_value_blocks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscription',
+            name='uuid',
+            field=models.UUIDField(db_index=True, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(condition=models.Q(deleted=False), fields=('uuid',), name='subscription_uuid_unique'),
+        ),
+    ]
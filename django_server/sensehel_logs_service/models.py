@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class AuthenticationToken(models.Model):
@@ -22,8 +24,27 @@ class SensorAttribute(models.Model):
         return self.description or self.uri
 
 
+class SubscriptionManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted=False)
+
+
 class Subscription(models.Model):
-    uuid = models.UUIDField(editable=False, unique=True)
+    uuid = models.UUIDField(editable=False, db_index=True)
+    deleted = models.BooleanField(
+        default=False, help_text='Unsubscribed; hidden everywhere until purged by the purge_subscriptions command.')
+    updated_at = models.DateTimeField(
+        default=timezone.now, help_text='Last time values were received or attributes changed for the subscription.')
+
+    # Only subscriptions not marked deleted are visible through the default manager:
+    objects = SubscriptionManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        # Unsubscribed subscriptions keep their UUID until purged, while SenseHel may subscribe again with it:
+        constraints = [models.UniqueConstraint(
+            fields=['uuid'], condition=models.Q(deleted=False), name='subscription_uuid_unique')]
 
     def __str__(self):
         return f'Subscription({self.uuid})'
@@ -35,17 +56,113 @@ class AttributeSubscription(models.Model):
     attribute_id = models.IntegerField(
         help_text='Id received from SenseHel, identifying a particular attribute of a particular sensor.')
 
+    # Statistics over all values received, kept up to date on data submission; see the rebuild_attribute_stats
+    # management command:
+    values_count = models.BigIntegerField(default=0)
+    values_sum = models.DecimalField(max_digits=20, decimal_places=1, default=0)
+    values_min = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)
+    values_max = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True)
+
+    cold_until = models.DateTimeField(
+        null=True, blank=True, help_text='End of the last day of values moved to cold storage, if any.')
+
+    @property
+    def values_avg(self):
+        return self.values_sum / self.values_count if self.values_count else None
+
     def __str__(self):
         return f'AttributeSubscription({self.id})'
 
 
 class Value(models.Model):
-    attribute = models.ForeignKey(AttributeSubscription, related_name='values', on_delete=models.CASCADE)
+    # Lookups by attribute are served by the index of the unique (attribute, timestamp) constraint below:
+    attribute = models.ForeignKey(
+        AttributeSubscription, related_name='values', on_delete=models.CASCADE, db_index=False)
     value = models.DecimalField(max_digits=10, decimal_places=1)
     timestamp = models.DateTimeField()
 
     class Meta:
         ordering = ['timestamp']
+        # Includes the partition key, as required on PostgreSQL, see migration 0005_partition_values:
+        constraints = [
+            models.UniqueConstraint(fields=['attribute', 'timestamp'], name='value_attribute_timestamp_unique')]
 
     def __str__(self):
         return str(self.value)
+
+
+class ValueBlock(models.Model):
+    """
+    The values of one attribute subscription over one UTC day, compressed; see sensehel_logs_service.cold_storage.
+    """
+    # Lookups by attribute are served by the unique (attribute, day) index:
+    attribute = models.ForeignKey(
+        AttributeSubscription, related_name='value_blocks', on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    count = models.IntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        ordering = ['day']
+        unique_together = [['attribute', 'day']]
+
+    def __str__(self):
+        return f'ValueBlock({self.attribute_id}, {self.day})'
+
+
+class Rollup(models.Model):
+    """
+    Aggregate of the values of one attribute subscription over a time period, kept up to date on data submission.
+    """
+    period = None
+
+    # Lookups by attribute are served by the unique (attribute, bucket) index:
+    attribute = models.ForeignKey(AttributeSubscription, on_delete=models.CASCADE, db_index=False)
+    bucket = models.DateTimeField(help_text='Start of the aggregated time period.')
+    count = models.IntegerField()
+    sum = models.DecimalField(max_digits=20, decimal_places=1)
+    min = models.DecimalField(max_digits=10, decimal_places=1)
+    max = models.DecimalField(max_digits=10, decimal_places=1)
+
+    class Meta:
+        abstract = True
+        ordering = ['bucket']
+        unique_together = [['attribute', 'bucket']]
+
+    @property
+    def avg(self):
+        return self.sum / self.count
+
+    def __str__(self):
+        return f'{self.__class__.__name__}({self.attribute_id}, {self.bucket})'
+
+
+class HourlyRollup(Rollup):
+    period = 'hour'
+
+
+class DailyRollup(Rollup):
+    period = 'day'
+
+
+class RequestProfile(models.Model):
+    """
+    Profile of a single request, captured on demand by staff users, see sensehel_logs_service.profiling.
+    """
+    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    status_code = models.IntegerField()
+    duration = models.FloatField(help_text='Seconds.')
+    query_count = models.IntegerField()
+    query_time = models.FloatField(help_text='Seconds.')
+    queries = models.JSONField(help_text='SQL timeline: start and duration in milliseconds, and statement.')
+    stats = models.TextField(help_text='cProfile statistics, by cumulative time.')
+    profile = models.BinaryField(help_text='Raw cProfile data, as written by pstats.Stats.dump_stats.')
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
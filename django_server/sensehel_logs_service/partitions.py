@@ -0,0 +1,108 @@
+"""
+Management of the monthly partitions of the Value table on PostgreSQL, see migration 0005_partition_values.
+"""
+import re
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sensehel_logs_service import models
+
+TABLE = models.Value._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(timestamp, months=0):
+    """
+    Return the start of the month `months` months after the month of the timestamp, in UTC.
+    """
+    month = timestamp.year * 12 + timestamp.month - 1 + months
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start):
+    return f'{TABLE}_y{start.year}m{start.month:02d}'
+
+
+def parse_bound(bound):
+    return None if bound in ('MINVALUE', 'MAXVALUE') else parse_datetime(bound.strip("'"))
+
+
+def list_partitions():
+    """
+    Return (name, start, end) for each range partition of the Value table, ordered by start. Start or end are None
+    for unbounded ranges. The default partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass''', [TABLE])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = re.match(r"FOR VALUES FROM \((.+)\) TO \((.+)\)", bound)
+        if match:
+            partitions.append((name, parse_bound(match.group(1)), parse_bound(match.group(2))))
+    return sorted(partitions, key=lambda p: p[1] or datetime.min.replace(tzinfo=timezone.utc))
+
+
+def create_partition(start, end):
+    """
+    Create a partition for values in [start, end). Any such values already stored in the default partition are
+    moved to the new partition.
+    """
+    name, qn = partition_name(start), connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(f'''
+            WITH moved AS (
+                DELETE FROM {qn(DEFAULT_PARTITION)} WHERE timestamp >= %s AND timestamp < %s RETURNING *)
+            INSERT INTO {qn(name)} SELECT * FROM moved''', [start, end])
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)',
+                       [start, end])
+    return name
+
+
+def ensure_partitions(months_ahead, now=None):
+    """
+    Create the monthly partitions missing for the current month and the given number of following months.
+    Months already covered, even partially, by an existing partition are skipped.
+    """
+    now = now or timezone.now()
+    existing = list_partitions()
+    created = []
+    for i in range(months_ahead + 1):
+        start, end = month_start(now, i), month_start(now, i + 1)
+        overlaps = any((p_start is None or p_start < end) and (p_end is None or p_end > start)
+                       for name, p_start, p_end in existing)
+        if not overlaps:
+            created.append(create_partition(start, end))
+    return created
+
+
+def remove_partitions_before(cutoff, drop=True):
+    """
+    Detach, and unless drop is False also drop, all partitions holding only values older than the cutoff. This
+    frees the space at once, without the table and index bloat caused by deleting rows. All subscriptions are marked
+    as updated, as finding those with values in a partition would mean scanning it.
+
+    Must not be run in a transaction that has written values: PostgreSQL refuses to detach or drop a partition with
+    foreign key checks still deferred to the end of the transaction.
+    """
+    qn = connection.ops.quote_name
+    removed = []
+    for name, start, end in list_partitions():
+        if end is not None and end <= cutoff:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {qn(TABLE)} DETACH PARTITION {qn(name)}')
+                if drop:
+                    cursor.execute(f'DROP TABLE {qn(name)}')
+                # Invalidate the responses cached by clients through conditional requests, which may include the
+                # removed values:
+                models.Subscription.all_objects.update(updated_at=timezone.now())
+            removed.append(name)
+    return removed
@@ -0,0 +1,108 @@
+"""
+Pre-built payloads for the 24 hour preview embedded in the SenseHel UI, kept gzip compressed in the Django cache
+named by PREVIEW_CACHE and updated with newly received values on data submission, so that serving a preview
+normally needs no queries on the value table.
+
+Each entry records the Subscription.updated_at it corresponds to. An entry not matching the subscription, because
+values were stored by a process not sharing the cache, or because the storing transaction was rolled back, is
+rebuilt from the database when next requested.
+"""
+import gzip
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from sensehel_logs_service import models
+from sensehel_logs_service.downsampling import downsample
+from sensehel_logs_service.rest.serializers import serialize_values_columnar
+
+PERIOD = timedelta(hours=24)
+
+
+def cache():
+    return caches[settings.PREVIEW_CACHE]
+
+
+def cache_key(subscription_uuid):
+    return f'subscription-preview:{subscription_uuid}'
+
+
+def build(subscription):
+    """
+    Build the preview entry of the subscription from the database.
+    """
+    attributes = list(subscription.attributes.select_related('attribute_type').order_by('id'))
+    rows = models.Value.objects.filter(
+        attribute__in=[attr.id for attr in attributes], timestamp__gte=timezone.now() - PERIOD)\
+        .order_by('attribute_id', 'timestamp').values_list('attribute_id', 'timestamp', 'value')
+    values = dict((attr.id, []) for attr in attributes)
+    for attribute_id, timestamp, value in rows:
+        values[attribute_id].append((timestamp, value))
+
+    return compress({
+        'uuid': str(subscription.uuid),
+        'updated_at': subscription.updated_at,
+        'attributes': [{
+            'pk': attr.id,
+            'id': attr.attribute_id,
+            'uri': attr.attribute_type.uri,
+            'description': attr.attribute_type.description,
+            'values': values[attr.id]
+        } for attr in attributes]
+    })
+
+
+def compress(entry):
+    """
+    Render the gzip compressed JSON payload of the entry, in the columnar format of subscription retrieve.
+    """
+    entry['body'] = gzip.compress(json.dumps({
+        'uuid': entry['uuid'],
+        'attributes': [{
+            'id': attr['id'],
+            'uri': attr['uri'],
+            'description': attr['description'],
+            'values': serialize_values_columnar(downsample(attr['values'], settings.PREVIEW_MAX_POINTS))
+        } for attr in entry['attributes']]
+    }).encode())
+    return entry
+
+
+def get(subscription):
+    """
+    Return the up to date preview entry of the subscription, building it if necessary.
+    """
+    entry = cache().get(cache_key(subscription.uuid))
+    if entry is None or entry['updated_at'] != subscription.updated_at:
+        entry = build(subscription)
+        cache().set(cache_key(subscription.uuid), entry, settings.PREVIEW_CACHE_TIMEOUT)
+    return entry
+
+
+def update(subscription_uuid, values, previous_updated_at, updated_at):
+    """
+    Add the given newly stored values to the cached preview of the subscription, if there is one, and drop values
+    which have fallen out of the preview period. The entry is only updated if it includes all the values stored up
+    to previous_updated_at, the Subscription.updated_at replaced on storing these values, as otherwise updates are
+    applied out of order or concurrently; it is then deleted instead, to be rebuilt.
+    """
+    key = cache_key(subscription_uuid)
+    entry = cache().get(key)
+    if entry is None:
+        return
+    if entry['updated_at'] != previous_updated_at:
+        cache().delete(key)
+        return
+
+    since = timezone.now() - PERIOD
+    for attr in entry['attributes']:
+        new_values = [(value.timestamp, value.value) for value in values
+                      if value.attribute_id == attr['pk'] and value.timestamp >= since]
+        attr['values'] = [row for row in attr['values'] if row[0] >= since]
+        if new_values:
+            attr['values'] = sorted(attr['values'] + new_values, key=lambda row: row[0])
+    entry['updated_at'] = updated_at
+    cache().set(key, compress(entry), settings.PREVIEW_CACHE_TIMEOUT)
@@ -0,0 +1,81 @@
+"""
+On demand profiling of single requests by staff users: requests with a `_profile` GET parameter or an `X-Profile`
+header are run under cProfile, with their SQL statements timed, and the result is stored as a RequestProfile to be
+inspected in the admin. The response carries the admin URL of the profile in an `X-Profile-URL` header; with
+`_profile=text` the profile statistics are returned instead of the response.
+
+Only requests handled synchronously, as under WSGI, are profiled: cProfile cannot follow a request across the threads
+and the event loop it is handled in under ASGI, where the profiling parameter and header are ignored.
+"""
+import asyncio
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.decorators import sync_and_async_middleware
+
+from sensehel_logs_service import models
+
+PROFILE_VAR = '_profile'
+
+
+def profiling_requested(request):
+    return (PROFILE_VAR in request.GET or 'HTTP_X_PROFILE' in request.META) and request.user.is_staff
+
+
+def profile_request(get_response, request):
+    mode = request.GET.get(PROFILE_VAR, '')
+    # Hide the parameter from the view, e.g. from admin changelists which would take it for a filter:
+    request.GET = request.GET.copy()
+    request.GET.pop(PROFILE_VAR, None)
+
+    queries = []
+    start = time.perf_counter()
+
+    def record_query(execute, sql, params, many, context):
+        query_start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries.append({'start': round((query_start - start) * 1000, 3),
+                            'duration': round((time.perf_counter() - query_start) * 1000, 3),
+                            'sql': sql})
+
+    profiler = cProfile.Profile()
+    with connection.execute_wrapper(record_query):
+        response = profiler.runcall(get_response, request)
+    duration = time.perf_counter() - start
+
+    stats_output = io.StringIO()
+    pstats.Stats(profiler, stream=stats_output).sort_stats('cumulative').print_stats(settings.PROFILE_STATS_LINES)
+    profiler.create_stats()
+    profile = models.RequestProfile.objects.create(
+        user=request.user, method=request.method, path=request.get_full_path(), status_code=response.status_code,
+        duration=duration, query_count=len(queries), query_time=sum(query['duration'] for query in queries) / 1000,
+        queries=queries, stats=stats_output.getvalue(), profile=marshal.dumps(profiler.stats))
+    models.RequestProfile.objects.filter(
+        id__in=models.RequestProfile.objects.values('id')[settings.PROFILES_KEPT:]).delete()
+
+    if mode == 'text':
+        return HttpResponse(stats_output.getvalue(), content_type='text/plain')
+    response['X-Profile-URL'] = reverse('admin:sensehel_logs_service_requestprofile_change', args=[profile.id])
+    return response
+
+
+@sync_and_async_middleware
+def ProfilingMiddleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+        # cProfile cannot follow the request across threads; profiling only applies to synchronous request handling:
+        return get_response
+
+    def middleware(request):
+        if profiling_requested(request):
+            return profile_request(get_response, request)
+        return get_response(request)
+    return middleware
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.conf.urls import url
+from django.urls import path
 from rest_framework import routers
 
 from .permissions import SenseHelAuthPermission  # noqa
@@ -6,6 +8,7 @@ from .subscription import SubscriptionsViewSet
 from .data_submission import SubmitData
 from .schema import APISchema
 from .schema_view import schema_view
+from . import async_views
 
 router = routers.DefaultRouter()
 router.register('subscriptions', SubscriptionsViewSet)
@@ -13,3 +16,9 @@ router.register('subscriptions', SubscriptionsViewSet)
 urls = router.urls + [
     url('values/', SubmitData.as_view(), name='values-create')
 ]
+
+if settings.ASYNC_VIEWS:
+    urls = [
+        path('values/', async_views.submit_data, name='values-create'),
+        path('subscriptions/<uuid:uuid>/', async_views.retrieve_subscription, name='subscription-detail')
+    ] + urls
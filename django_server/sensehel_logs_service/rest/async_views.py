@@ -0,0 +1,101 @@
+"""
+Native async implementations of data submission and subscription retrieve, for running the service under ASGI.
+
+The Django ORM is synchronous, so the database work of each request is run in a thread pool, without blocking the
+event loop or being serialized with the database work of other requests. Enabled by setting ASYNC_VIEWS, which
+routes the SubmitData and subscription retrieve URLs to these views instead of the DRF ones.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework import exceptions, status
+from rest_framework.utils.encoders import JSONEncoder
+
+from sensehel_logs_service import models
+from .conditional import get_validators, not_modified_response, set_validators
+from .data_submission import SubscriptionValuesSerializer
+from .permissions import token_cache
+from .serializers import SubscriptionSerializer
+from .subscription import prefetch_attributes
+
+
+def in_thread(fn):
+    """
+    Run the blocking function in the thread pool, releasing expired database connections of the pool thread
+    before and after, as Django does around each request.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def api_response(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+def error_response(exc):
+    # Same response body as produced by DRF's default exception handler:
+    return api_response(exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail},
+                        exc.status_code)
+
+
+def save_values(data):
+    serializer = SubscriptionValuesSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return serializer.data
+
+
+async def submit_data(request):
+    if request.method != 'POST':
+        return error_response(exceptions.MethodNotAllowed(request.method))
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return error_response(exceptions.ParseError())
+    if not isinstance(data, dict):
+        return error_response(exceptions.ParseError())
+
+    token = data.get('auth_token', None)
+    if not (token and await in_thread(token_cache.is_valid)(token)):
+        return error_response(exceptions.NotAuthenticated())
+
+    try:
+        values = await in_thread(save_values)(data)
+    except exceptions.APIException as e:
+        return error_response(e)
+    return api_response(values, status.HTTP_202_ACCEPTED if settings.VALUES_WRITE_BEHIND else status.HTTP_201_CREATED)
+
+
+# SenseHel authenticates with the auth_token, not with a session. Not using the csrf_exempt decorator, which would
+# hide that the view is async:
+submit_data.csrf_exempt = True
+
+
+def serialize_subscription(request, subscription):
+    return SubscriptionSerializer(prefetch_attributes(subscription), context={'request': request}).data
+
+
+async def retrieve_subscription(request, uuid):
+    if request.method != 'GET':
+        return error_response(exceptions.MethodNotAllowed(request.method))
+    try:
+        subscription = await in_thread(models.Subscription.objects.get)(uuid=uuid)
+    except models.Subscription.DoesNotExist:
+        return error_response(exceptions.NotFound())
+
+    validators = get_validators(subscription)
+    not_modified = not_modified_response(request, validators)
+    if not_modified:
+        return not_modified
+    try:
+        return set_validators(api_response(await in_thread(serialize_subscription)(request, subscription)), validators)
+    except exceptions.APIException as e:
+        return error_response(e)
@@ -0,0 +1,48 @@
+"""
+Conditional GET support for subscription data, based on Subscription.updated_at, which is bumped whenever values
+are received or attributes change for the subscription, and when old values are removed with their partition.
+"""
+import time
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+# Subscription.updated_at never moves backwards and is stamped last in the transactions writing values, see
+# ingestion.touch_subscriptions; modifications committed within this many seconds of being stamped, as they are in
+# practice, are known to come after a Last-Modified time given once that margin is over:
+COMMIT_MARGIN = 1
+
+
+def get_validators(subscription):
+    """
+    Return the ETag and the exact last modification timestamp of the current data of the subscription.
+    """
+    updated_at = subscription.updated_at.timestamp()
+    return quote_etag(f'{subscription.uuid}-{int(updated_at * 1e6):x}'), updated_at
+
+
+def not_modified_response(request, validators):
+    """
+    Return a 304 Not Modified response if the client already has the current representation, else None. Answered
+    from If-Modified-Since only if the data was last modified strictly before the given time.
+    """
+    etag, updated_at = validators
+    return get_conditional_response(request, etag=etag, last_modified=updated_at)
+
+
+def last_modified(updated_at):
+    """
+    Return the Last-Modified time, in whole seconds, for data last modified at the given timestamp: the end of its
+    second, once COMMIT_MARGIN seconds past, as later modifications are then known to be stamped after it. Until
+    then only the start of the second can be given, for which If-Modified-Since never gives a 304.
+    """
+    return min(int(updated_at) + 1, int(time.time() - COMMIT_MARGIN))
+
+
+def set_validators(response, validators):
+    etag, updated_at = validators
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified(updated_at))
+    # Have browsers revalidate each time instead of heuristically reusing the response:
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -1,41 +1,63 @@
 import uuid
-from rest_framework import serializers
+
+from django.conf import settings
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.generics import CreateAPIView
 
-from sensehel_logs_service import models
+from sensehel_logs_service import models, ingestion, write_behind
 from .permissions import SenseHelAuthPermission
 from .schema import fix_doc, expected_response_code
-from .serializers import SubscriptionSerializer, ValueSerializer
+from .serializers import SubscriptionSerializer
+
+
+class QueueFull(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many values waiting to be stored, try again later.'
+    default_code = 'queue_full'
 
 
-class CreatedValueSerializer(ValueSerializer):
-    attribute = serializers.IntegerField(source='attribute.attribute_id')
+class SubmittedValueSerializer(serializers.Serializer):
+    attribute = serializers.IntegerField()
+    timestamp = serializers.DateTimeField()
+    # Rounded to the decimals stored, or rejected if it cannot be stored, by ingestion.round_value:
+    value = serializers.DecimalField(max_digits=None, decimal_places=None)
 
-    class Meta(ValueSerializer.Meta):
-        fields = ['attribute', 'timestamp', 'value']
+    def validate_value(self, value):
+        try:
+            return ingestion.round_value(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
 
 
 class SubscriptionValuesSerializer(SubscriptionSerializer):
-    values = serializers.SerializerMethodField()
+    values = SubmittedValueSerializer(many=True)
+    # Null in write-behind mode, where the values are only stored after responding:
+    accepted = serializers.IntegerField(read_only=True, allow_null=True)
+    duplicates = serializers.IntegerField(read_only=True, allow_null=True)
 
     class Meta(SubscriptionSerializer.Meta):
-        fields = ['uuid', 'values']
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.values_data = kwargs.get('data', {}).get('values', {})
-        self.values = []
+        fields = ['uuid', 'values', 'accepted', 'duplicates']
 
     def create(self, validated_data):
-        subscription = models.Subscription.objects.get(uuid=validated_data['uuid'])
-        attrs_by_id = dict([(attr.attribute_id, attr) for attr in subscription.attributes.all()])
-        for value in self.values_data:
-            self.values.append(
-                attrs_by_id[value['attribute']].values.create(value=value['value'], timestamp=value['timestamp']))
-        return subscription
+        attribute_ids = ingestion.get_attribute_ids(validated_data['uuid'])
+        if attribute_ids is None:
+            raise NotFound()
+        unknown_ids = set(value['attribute'] for value in validated_data['values']).difference(attribute_ids)
+        if unknown_ids:
+            raise serializers.ValidationError({'values': f'Unknown attribute ids: {sorted(unknown_ids)}'})
+
+        values = [
+            models.Value(attribute_id=attribute_ids[value['attribute']],
+                         value=value['value'], timestamp=value['timestamp'])
+            for value in validated_data['values']]
+        if not settings.VALUES_WRITE_BEHIND:
+            stored = ingestion.store_values(values)
+            return dict(validated_data, accepted=len(stored), duplicates=len(values) - len(stored))
+        elif not write_behind.buffer.submit(values):
+            raise QueueFull()
+        return dict(validated_data, accepted=None, duplicates=None)
 
-    def get_values(self, subscription):
-        return CreatedValueSerializer(self.values, many=True).data
 
 @fix_doc
 @expected_response_code(201)
@@ -50,6 +72,16 @@ class SubmitData(CreateAPIView):
       - **attribute**: Attribute id passed by SernseHel on subscription creation; identifies the measured quantity
       - **timestamp**: Timestamp for when the value was measured
       - **value**: Numerical value
+
+    Values for an attribute and timestamp already stored, as when retrying a submission, are skipped. The response
+    repeats the submitted values, along with:
+
+    - **accepted**: The number of values stored
+    - **duplicates**: The number of values skipped as already stored
+
+    Returns 201 once the values are stored. When the service runs in write-behind mode, it instead returns 202
+    as soon as the values are validated and queued for storage, with null counts, or 503 if too many values are
+    already queued.
     """
     permission_classes = [SenseHelAuthPermission]
     queryset = models.Subscription.objects.all()
@@ -64,4 +96,10 @@ class SubmitData(CreateAPIView):
             'value': 22.3
         }]
     }
-    example_response = example_request
+    example_response = dict(example_request, accepted=1, duplicates=0)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if settings.VALUES_WRITE_BEHIND:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
@@ -0,0 +1,58 @@
+import csv
+
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+from sensehel_logs_service import cold_storage, models
+
+
+class ExportParamsSerializer(serializers.Serializer):
+    attribute = serializers.IntegerField(required=False)
+    to = serializers.DateTimeField(required=False)
+
+    def get_fields(self):
+        # "from" is a reserved word and cannot be declared as a class attribute:
+        return dict(super().get_fields(), **{'from': serializers.DateTimeField(required=False)})
+
+
+class Echo:
+    """
+    Pseudo-buffer for csv.writer, returning each written row instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+
+def values_csv_response(subscription, params):
+    """
+    Stream the values of the subscription as CSV, reading them through a server-side cursor, and any values in cold
+    storage one block at a time, so that memory use stays constant regardless of the size of the export.
+    """
+    attributes = subscription.attributes.select_related('attribute_type')
+    if 'attribute' in params:
+        attributes = attributes.filter(attribute_id=params['attribute'])
+    attributes = list(attributes)
+    descriptions = dict((attr.id, attr.attribute_type.description) for attr in attributes)
+
+    values = models.Value.objects.filter(attribute__in=descriptions.keys()).order_by('attribute_id', 'timestamp')
+    if 'from' in params:
+        values = values.filter(timestamp__gte=params['from'])
+    if 'to' in params:
+        values = values.filter(timestamp__lt=params['to'])
+
+    timestamp_field = serializers.DateTimeField()
+    writer = csv.writer(Echo())
+    single_attribute = 'attribute' in params
+
+    def rows():
+        yield writer.writerow(['timestamp', 'value'] if single_attribute else ['attribute', 'timestamp', 'value'])
+        hot_rows = values.values_list('attribute_id', 'timestamp', 'value').iterator(chunk_size=2000)
+        for attribute_id, timestamp, value in cold_storage.with_cold_rows(
+                hot_rows, attributes, gte=params.get('from', None), lt=params.get('to', None)):
+            row = [timestamp_field.to_representation(timestamp), value]
+            yield writer.writerow(row if single_attribute else [descriptions[attribute_id]] + row)
+
+    filename = list(descriptions.values())[0] if single_attribute and descriptions else 'values'
+    response = StreamingHttpResponse(rows(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
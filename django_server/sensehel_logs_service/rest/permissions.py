@@ -1,6 +1,56 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
 from rest_framework import permissions
 
 from sensehel_logs_service import models
+from sensehel_logs_service.caches import TTLCache
+
+
+class TokenCache:
+    """
+    Remembers valid SenseHel authentication tokens for AUTH_TOKEN_CACHE_TTL seconds, either in process or in the
+    Django cache named by AUTH_TOKEN_CACHE. Tokens are invalidated on change or deletion through signals, see
+    sensehel_logs_service.signals.
+    """
+    key_prefix = 'sensehel-auth-token:'
+
+    def __init__(self):
+        self.local = TTLCache(settings.AUTH_TOKEN_CACHE_TTL)
+
+    @property
+    def shared(self):
+        return settings.AUTH_TOKEN_CACHE and caches[settings.AUTH_TOKEN_CACHE]
+
+    def key(self, token):
+        return self.key_prefix + str(uuid.UUID(str(token)))
+
+    def is_valid(self, token):
+        try:
+            key = self.key(token)
+        except ValueError:
+            return False
+
+        cache = self.shared or self.local
+        if cache.get(key):
+            return True
+        valid = models.AuthenticationToken.objects.filter(token=token).exists()
+        if valid:
+            if self.shared:
+                self.shared.set(key, True, settings.AUTH_TOKEN_CACHE_TTL)
+            else:
+                self.local.set(key, True)
+        return valid
+
+    def invalidate(self, token):
+        key = self.key(token)
+        self.local.delete(key)
+        if self.shared:
+            self.shared.delete(key)
+
+
+token_cache = TokenCache()
 
 
 class SenseHelAuthPermission(permissions.BasePermission):
@@ -10,7 +60,7 @@ class SenseHelAuthPermission(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         token = request.data.get('auth_token', None)
-        return token and models.AuthenticationToken.objects.filter(token=token).exists()
+        return bool(token) and token_cache.is_valid(token)
 
     @classmethod
     def append_doc(cls, fn):
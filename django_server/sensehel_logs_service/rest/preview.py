@@ -0,0 +1,21 @@
+import gzip
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from sensehel_logs_service import preview
+
+
+def preview_response(request, subscription):
+    """
+    Respond with the preview payload of the subscription, as compressed in the cache if the client accepts gzip,
+    as browsers do.
+    """
+    entry = preview.get(subscription)
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(entry['body'], content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(entry['body']), content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -1,6 +1,12 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Manager
+from django.utils import timezone
 from rest_framework import serializers
 
-from sensehel_logs_service import models
+from sensehel_logs_service import cold_storage, models
+from sensehel_logs_service.downsampling import downsample
 
 
 class ValueSerializer(serializers.ModelSerializer):
@@ -9,23 +15,113 @@ class ValueSerializer(serializers.ModelSerializer):
         fields = ['timestamp', 'value']
 
 
+def serialize_values(rows):
+    """
+    Represent (timestamp, value) rows exactly as ValueSerializer represents Value instances (ISO 8601 timestamps
+    in the current time zone, decimals as strings), without the per-instance and per-field overhead of DRF
+    serializers. As the result only contains strings, rendering it to JSON stays within the C implementation
+    of the json module.
+    """
+    tz = timezone.get_current_timezone()
+    values = []
+    for timestamp, value in rows:
+        timestamp = timestamp.astimezone(tz).isoformat()
+        if timestamp.endswith('+00:00'):
+            timestamp = timestamp[:-6] + 'Z'
+        values.append({'timestamp': timestamp, 'value': '{:f}'.format(value)})
+    return values
+
+
+def serialize_values_columnar(rows):
+    """
+    Represent (timestamp, value) rows as parallel arrays of epoch millisecond timestamps and float values, several
+    times more compact to transfer and faster to parse than serialize_values for long series.
+    """
+    timestamps, values = [], []
+    for timestamp, value in rows:
+        timestamps.append(int(timestamp.timestamp() * 1000))
+        values.append(float(value))
+    return {'timestamps': timestamps, 'values': values}
+
+
+class AttributeSubscriptionListSerializer(serializers.ListSerializer):
+    """
+    Fetches the values of all the serialized attribute subscriptions with a single query, plus one for any values in
+    cold storage.
+    """
+    def to_representation(self, data):
+        attributes = list(data.all() if isinstance(data, Manager) else data)
+        rows = self.child.values_rows(attributes)
+        self.child.values_by_attribute = dict(
+            (attribute_id, [(timestamp, value) for _, timestamp, value in attribute_rows])
+            for attribute_id, attribute_rows in groupby(rows, itemgetter(0)))
+        return super().to_representation(attributes)
+
+
 class AttributeSubscriptionSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='attribute_id')
     uri = serializers.CharField(source='attribute_type.uri')
     description = serializers.CharField(source='attribute_type.description')
     values = serializers.SerializerMethodField()
 
+    values_by_attribute = None
+
     class Meta:
         model = models.AttributeSubscription
         fields = ['id', 'uri', 'description', 'values']
+        list_serializer_class = AttributeSubscriptionListSerializer
 
-    def get_values(self, attribute_subscription):
-        from_timestamp = self.context['request'].GET.get('values_timestamp_gt', None)
+    def values_rows(self, attributes):
+        """
+        Return the (attribute_id, timestamp, value) rows of the attribute subscriptions, ordered by attribute and
+        timestamp, including those in cold storage.
+        """
+        from_timestamp = self.get_from_timestamp()
+        qs = models.Value.objects.filter(attribute__in=[attr.id for attr in attributes])
         if from_timestamp:
-            qs = attribute_subscription.values.filter(timestamp__gt=from_timestamp)
+            qs = qs.filter(timestamp__gt=from_timestamp)
+        rows = qs.values_list('attribute_id', 'timestamp', 'value').order_by('attribute_id', 'timestamp')
+        return cold_storage.with_cold_rows(rows, attributes, gt=from_timestamp)
+
+    def get_values(self, attribute_subscription):
+        if self.values_by_attribute is None:
+            rows = [(timestamp, value) for _, timestamp, value in self.values_rows([attribute_subscription])]
         else:
-            qs = attribute_subscription.values.all()
-        return ValueSerializer(qs, many=True).data
+            rows = self.values_by_attribute.get(attribute_subscription.id, [])
+
+        max_points = self.get_max_points()
+        if max_points:
+            rows = downsample(list(rows), max_points)
+        if self.get_values_format() == 'columnar':
+            return serialize_values_columnar(rows)
+        return serialize_values(rows)
+
+    def get_from_timestamp(self):
+        from_timestamp = self.context['request'].GET.get('values_timestamp_gt', None)
+        if from_timestamp is None:
+            return None
+        try:
+            return serializers.DateTimeField().run_validation(from_timestamp)
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({'values_timestamp_gt': e.detail})
+
+    def get_values_format(self):
+        values_format = self.context['request'].GET.get('values_format', None)
+        if values_format is None:
+            return None
+        try:
+            return serializers.ChoiceField(['columnar']).run_validation(values_format)
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({'values_format': e.detail})
+
+    def get_max_points(self):
+        max_points = self.context['request'].GET.get('max_points', None)
+        if max_points is None:
+            return None
+        try:
+            return serializers.IntegerField(min_value=3).run_validation(max_points)
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({'max_points': e.detail})
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -35,3 +131,17 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Subscription
         fields = ['uuid', 'attributes']
+
+
+class AttributeStatsSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='attribute_id')
+    uri = serializers.CharField(source='attribute_type.uri')
+    description = serializers.CharField(source='attribute_type.description')
+    count = serializers.IntegerField(source='values_count')
+    min = serializers.DecimalField(source='values_min', max_digits=10, decimal_places=1)
+    avg = serializers.DecimalField(source='values_avg', max_digits=None, decimal_places=4)
+    max = serializers.DecimalField(source='values_max', max_digits=10, decimal_places=1)
+
+    class Meta:
+        model = models.AttributeSubscription
+        fields = ['id', 'uri', 'description', 'count', 'min', 'avg', 'max']
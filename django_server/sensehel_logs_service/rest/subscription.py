@@ -1,11 +1,17 @@
 import uuid
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import viewsets, mixins, permissions, decorators
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
 from sensehel_logs_service import models
+from .conditional import get_validators, not_modified_response, set_validators
+from .export import ExportParamsSerializer, values_csv_response
 from .permissions import SenseHelAuthPermission
+from .preview import preview_response
 from .schema import fix_doc, expected_response_code, override_example_request
-from .serializers import SubscriptionSerializer
+from .serializers import SubscriptionSerializer, AttributeStatsSerializer
+from .values import ValuesPageParamsSerializer, values_page
 
 
 class CreateSubscriptionSerializer(SubscriptionSerializer):
@@ -20,6 +26,13 @@ class CreateSubscriptionSerializer(SubscriptionSerializer):
         return subscription
 
 
+def prefetch_attributes(subscription):
+    # Values are fetched for all attributes at once by AttributeSubscriptionListSerializer:
+    prefetch_related_objects([subscription], Prefetch(
+        'attributes', queryset=models.AttributeSubscription.objects.select_related('attribute_type')))
+    return subscription
+
+
 class SubscriptionsViewSet(mixins.RetrieveModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet):
     queryset = models.Subscription.objects.all()
     serializer_class = SubscriptionSerializer
@@ -30,7 +43,11 @@ class SubscriptionsViewSet(mixins.RetrieveModelMixin, mixins.CreateModelMixin, v
     _permission_classes = {
         'create': [SenseHelAuthPermission],
         'unsubscribe': [SenseHelAuthPermission],
-        'retrieve': [permissions.AllowAny]
+        'retrieve': [permissions.AllowAny],
+        'export_csv': [permissions.AllowAny],
+        'attribute_values': [permissions.AllowAny],
+        'preview': [permissions.AllowAny],
+        'stats': [permissions.AllowAny]
     }
 
     example_request = {
@@ -67,7 +84,36 @@ class SubscriptionsViewSet(mixins.RetrieveModelMixin, mixins.CreateModelMixin, v
                 ]
             }]
         },
-        'unsubscribe': 'Empty response body'
+        'unsubscribe': 'Empty response body',
+        'export_csv': 'timestamp,value\n2020-02-26T12:29:05.059173Z,22.5\n',
+        'attribute_values': {
+            'values': [
+                {
+                    'timestamp': '2020-02-26T12:29:05.059173Z',
+                    'value': '22.5'
+                }
+            ],
+            'cursor': 'MjAyMC0wMi0yNlQxMjoyOTowNS4wNTkxNzMrMDA6MDB8MTIzNDU=',
+            'more': False
+        },
+        'preview': {
+            'uuid': example_request['uuid'],
+            'attributes': [{
+                'id': 1,
+                'uri': 'http://urn.fi/URN:NBN:fi:au:ucum:r73',
+                'description': 'temperature',
+                'values': {'timestamps': [1582720145059], 'values': [22.5]}
+            }]
+        },
+        'stats': [{
+            'id': 1,
+            'uri': 'http://urn.fi/URN:NBN:fi:au:ucum:r73',
+            'description': 'temperature',
+            'count': 1440,
+            'min': '18.5',
+            'avg': '21.2750',
+            'max': '24.0'
+        }]
     }
 
     @fix_doc
@@ -92,11 +138,79 @@ class SubscriptionsViewSet(mixins.RetrieveModelMixin, mixins.CreateModelMixin, v
         """
         Retrieve subscription and attached data points. Note that this request does not require authentication,
         only knowledge of the subscription UUID. This endpoint is not called by SenseHel, only used by the service UI.
-        Accepts optional **GET** parameter:
+        Accepts optional **GET** parameters:
 
         - **values_timestamp_gt**: Filters values to include only those newer than the passed value.
+        - **max_points**: Downsamples the values of each attribute to at most this many points, preserving the
+          visual shape of the series (Largest-Triangle-Three-Buckets). Intended for plotting long time periods.
+        - **values_format**: With **columnar**, the values of each attribute are returned as parallel arrays of epoch
+          millisecond timestamps and numeric values, e.g. `{"timestamps": [1582720145059], "values": [22.5]}`,
+          instead of a list of objects. Considerably more compact for long series.
+
+        Responses carry ETag and Last-Modified headers; requests with a matching If-None-Match or
+        If-Modified-Since header are answered with 304 Not Modified until new data arrives.
+        """
+        subscription = self.get_object()
+        validators = get_validators(subscription)
+        return not_modified_response(request, validators) or \
+            set_validators(Response(self.get_serializer(prefetch_attributes(subscription)).data), validators)
+
+    @decorators.action(detail=True, url_path='export.csv')
+    def export_csv(self, request, uuid=None):
+        """
+        Download the data points of the subscription as CSV. Like retrieve, this request does not require
+        authentication, only knowledge of the subscription UUID. Accepts optional **GET** parameters:
+
+        - **attribute**: Only export the values of the attribute with this id, as a timestamp,value table.
+          By default values of all attributes are exported, with the attribute description as the first column.
+        - **from**: Only export values measured at or after this timestamp.
+        - **to**: Only export values measured before this timestamp.
+        """
+        params = ExportParamsSerializer(data=request.GET)
+        params.is_valid(raise_exception=True)
+        return values_csv_response(self.get_object(), params.validated_data)
+
+    @decorators.action(detail=True, url_path=r'attributes/(?P<attribute_id>\d+)/values')
+    def attribute_values(self, request, uuid=None, attribute_id=None):
+        """
+        Page through the data points of one attribute of the subscription, identified by its SenseHel id, in
+        chronological order. Like retrieve, this request does not require authentication, only knowledge of the
+        subscription UUID. Accepts optional **GET** parameters:
+
+        - **from**: Only include values measured at or after this timestamp.
+        - **to**: Only include values measured before this timestamp.
+        - **limit**: Maximum number of values to return, 1000 by default and at most 10000.
+        - **cursor**: Continue after the last value of a previous response, by passing its **cursor**.
+
+        **more** is true when further values were available at the time of the request. The cursor of the last
+        page can be used to poll for values received later.
+        """
+        params = ValuesPageParamsSerializer(data=request.GET)
+        params.is_valid(raise_exception=True)
+        attribute = get_object_or_404(self.get_object().attributes, attribute_id=attribute_id)
+        return Response(values_page(attribute, params.validated_data))
+
+    @decorators.action(detail=True)
+    def preview(self, request, uuid=None):
+        """
+        The values of the last 24 hours, in the columnar format of retrieve, downsampled for plotting. Served from
+        a cache kept up to date on data submission, for the preview embedded in the SenseHel UI. Supports
+        conditional requests like retrieve.
+        """
+        subscription = self.get_object()
+        validators = get_validators(subscription)
+        return not_modified_response(request, validators) or \
+            set_validators(preview_response(request, subscription), validators)
+
+    @decorators.action(detail=True)
+    def stats(self, request, uuid=None):
+        """
+        Statistics over all the data points received for each attribute of the subscription: number of values and
+        their minimum, average and maximum. Like retrieve, this request does not require authentication, only
+        knowledge of the subscription UUID.
         """
-        return super().retrieve(request, *args, **kwargs)
+        attributes = self.get_object().attributes.select_related('attribute_type').order_by('id')
+        return Response(AttributeStatsSerializer(attributes, many=True).data)
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.serializer_class)
@@ -111,10 +225,12 @@ class SubscriptionsViewSet(mixins.RetrieveModelMixin, mixins.CreateModelMixin, v
     @decorators.action(detail=False, methods=['POST'])
     def unsubscribe(self, request):
         """
-        Delete the subscription and all related data points from the service.
+        Delete the subscription and all related data points from the service. The subscription is immediately
+        removed from the API; its data points are purged in the background.
         """
-        try:
-            models.Subscription.objects.get(uuid=request.data['uuid']).delete()
-        except models.Subscription.DoesNotExist:
+        subscription = models.Subscription.objects.filter(uuid=request.data['uuid']).first()
+        if subscription is None:
             return Response(status=404)
+        subscription.deleted = True
+        subscription.save(update_fields=['deleted'])
         return Response(status=204)
@@ -0,0 +1,76 @@
+import base64
+import heapq
+from itertools import islice
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from sensehel_logs_service import cold_storage
+from .export import ExportParamsSerializer
+from .serializers import serialize_values
+
+
+def encode_cursor(timestamp, value_id):
+    return base64.urlsafe_b64encode(f'{timestamp.isoformat()}|{value_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Return the (timestamp, id) of the last value seen, encoded in the cursor.
+    """
+    try:
+        timestamp, value_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        timestamp, value_id = parse_datetime(timestamp), int(value_id)
+    except ValueError:
+        timestamp = None
+    if timestamp is None:
+        raise serializers.ValidationError('Invalid cursor.')
+    return timestamp, value_id
+
+
+class ValuesPageParamsSerializer(ExportParamsSerializer):
+    attribute = None
+    limit = serializers.IntegerField(min_value=1, max_value=10000, default=1000)
+    cursor = serializers.CharField(required=False)
+
+    def validate_cursor(self, cursor):
+        return decode_cursor(cursor)
+
+
+def values_page(attribute, params):
+    """
+    Return at most params['limit'] values of the attribute subscription in chronological order, continuing after the
+    cursor if given, along with the cursor to continue from. Values are ordered by (timestamp, id) so that each
+    page is read with a single range scan of the (attribute, timestamp) index, however far into the history. Values
+    in cold storage are merged in with an id of 0, as they have none, and no two values share a timestamp anyway.
+    """
+    values = attribute.values.order_by('timestamp', 'id')
+    since, until = params.get('from', None), params.get('to', None)
+    if since:
+        values = values.filter(timestamp__gte=since)
+    if until:
+        values = values.filter(timestamp__lt=until)
+    cursor = params.get('cursor', None)
+    after = None
+    if cursor:
+        after, value_id = cursor
+        values = values.filter(Q(timestamp__gt=after) | Q(id__gt=value_id), timestamp__gte=after)
+
+    rows = values.values_list('id', 'timestamp', 'value')[:params['limit'] + 1]
+    start = max([timestamp for timestamp in [since, after] if timestamp], default=None)
+    if attribute.cold_until and not (start and start >= attribute.cold_until):
+        cold_rows = ((0, timestamp, value) for _, timestamp, value
+                     in cold_storage.cold_rows([attribute.id], gt=after, gte=since, lt=until))
+        rows = heapq.merge(rows, cold_rows, key=lambda row: (row[1], row[0]))
+    rows = list(islice(rows, params['limit'] + 1))
+    more = len(rows) > params['limit']
+    rows = rows[:params['limit']]
+    if rows:
+        cursor = (rows[-1][1], rows[-1][0])
+    return {
+        'values': serialize_values((timestamp, value) for _, timestamp, value in rows),
+        # Values arriving later can be fetched with the same cursor, so it is returned even at the end:
+        'cursor': encode_cursor(*cursor) if cursor else None,
+        'more': more
+    }
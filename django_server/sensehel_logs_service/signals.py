@@ -0,0 +1,57 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from sensehel_logs_service import models, preview
+from sensehel_logs_service.ingestion import attribute_ids_cache, values_stored
+from sensehel_logs_service.metrics import install_query_recorder, metrics
+from sensehel_logs_service.rest.permissions import token_cache
+
+
+@receiver(pre_save, sender=models.AuthenticationToken)
+def invalidate_changed_token(sender, instance, **kwargs):
+    if instance.pk:
+        for token in sender.objects.filter(pk=instance.pk).values_list('token', flat=True):
+            token_cache.invalidate(token)
+
+
+@receiver(post_delete, sender=models.AuthenticationToken)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.token)
+
+
+@receiver(post_save, sender=models.Subscription)
+@receiver(post_delete, sender=models.Subscription)
+def invalidate_changed_subscription(sender, instance, **kwargs):
+    attribute_ids_cache.delete(str(instance.uuid))
+
+
+@receiver(post_save, sender=models.AttributeSubscription)
+@receiver(post_delete, sender=models.AttributeSubscription)
+def invalidate_changed_attribute(sender, instance, **kwargs):
+    # Attribute subscriptions only change through the admin, so simply start over:
+    attribute_ids_cache.clear()
+    models.Subscription.all_objects.filter(id=instance.subscription_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=models.SensorAttribute)
+def touch_attribute_type_subscriptions(sender, instance, created, **kwargs):
+    if not created:
+        models.Subscription.all_objects.filter(attributes__attribute_type=instance).update(updated_at=timezone.now())
+
+
+@receiver(values_stored)
+def update_previews(sender, values_by_subscription, updated_at, **kwargs):
+    for subscription_uuid, values in values_by_subscription.items():
+        if subscription_uuid in updated_at:
+            preview.update(subscription_uuid, values, *updated_at[subscription_uuid])
+
+
+@receiver(values_stored)
+def count_ingested_values(sender, values, duplicates, **kwargs):
+    metrics.observe_values_ingested(len(values), duplicates)
+
+
+# Count the database queries of each request, see sensehel_logs_service.metrics:
+connection_created.connect(install_query_recorder)
@@ -0,0 +1,96 @@
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from sensehel_logs_service import ingestion, models
+from sensehel_logs_service.admin import EstimatedCountPaginator
+
+
+class ValueAdminTest(TestCase):
+    url = reverse('admin:sensehel_logs_service_value_changelist')
+    start = datetime(2020, 2, 26, 12, 0, tzinfo=timezone.utc)
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        attribute_type = models.SensorAttribute.objects.create(description='temperature', uri='temp')
+        self.subscriptions = [models.Subscription.objects.create(uuid=uuid.uuid4()) for i in range(2)]
+        for subscription in self.subscriptions:
+            attr = subscription.attributes.create(attribute_id=1, attribute_type=attribute_type)
+            ingestion.store_values([models.Value(attribute=attr, timestamp=self.start + timedelta(days=i * 10),
+                                                 value=i) for i in range(150)])
+
+    def test_keyset_pagination(self):
+        # When browsing the values:
+        response = self.client.get(self.url)
+
+        # Then the most recently stored values are shown first:
+        values = response.context['cl'].result_list
+        self.assertEqual(len(values), 100)
+        self.assertEqual(values[0], models.Value.objects.order_by('-id').first())
+
+        # And the next page continues after the last value shown:
+        older_url = response.context['cl'].older_url
+        self.assertEqual(older_url, f'?before={values[-1].id}')
+        response = self.client.get(self.url + older_url)
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        self.assertEqual(response.context['cl'].result_list[0].id, values[-1].id - 1)
+        self.assertContains(response, 'Newest')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Counts are only estimated on PostgreSQL')
+    def test_estimated_count(self):
+        # Given that the planner statistics are up to date:
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {models.Value._meta.db_table}')
+
+        # When browsing the values, with a lower limit for exact counts than the number of values:
+        with mock.patch.object(EstimatedCountPaginator, 'exact_count_limit', 100):
+            response = self.client.get(self.url)
+
+        # Then the count estimated by the planner is shown:
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['cl'].paginator.estimated)
+        self.assertContains(response, f'About {response.context["cl"].result_count} values')
+
+    def test_search_subscription_uuid(self):
+        # When searching for the UUID of a subscription:
+        response = self.client.get(self.url, {'q': str(self.subscriptions[0].uuid)})
+
+        # Then only its values are shown:
+        self.assertEqual(response.context['cl'].result_count, 150)
+        self.assertEqual(set(value.attribute.subscription_id for value in response.context['cl'].result_list),
+                         {self.subscriptions[0].id})
+
+        # And searching for anything else than a UUID finds nothing:
+        response = self.client.get(self.url, {'q': 'temperature'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_date_filters(self):
+        # When browsing the values:
+        response = self.client.get(self.url)
+
+        # Then the months with values are offered as filters:
+        month_filter = [spec for spec in response.context['cl'].filter_specs if spec.parameter_name == 'month'][0]
+        self.assertEqual(len(month_filter.lookup_choices), 50)
+        self.assertEqual(month_filter.lookup_choices[-1], ('2020-02', 'February 2020'))
+
+        # When filtering by month:
+        response = self.client.get(self.url, {'month': '2020-03'})
+
+        # Then only the values of that month are shown:
+        self.assertEqual(response.context['cl'].result_count, 6)
+
+        # And the days with values in that month are offered as filters:
+        day_filter = [spec for spec in response.context['cl'].filter_specs if spec.parameter_name == 'day'][0]
+        self.assertEqual([day for day, label in day_filter.lookup_choices], ['2020-03-07', '2020-03-17', '2020-03-27'])
+
+        # When filtering by day:
+        response = self.client.get(self.url, {'month': '2020-03', 'day': '2020-03-17'})
+
+        # Then only the values of that day are shown:
+        self.assertEqual(response.context['cl'].result_count, 2)
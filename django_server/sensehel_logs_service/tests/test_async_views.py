@@ -0,0 +1,83 @@
+import json
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from sensehel_logs_service import models
+from sensehel_logs_service.rest import async_views
+
+
+class AsyncViewsTest(TransactionTestCase):
+    # The async views run their database work in other threads, hence TransactionTestCase.
+    factory = RequestFactory()
+
+    def setUp(self):
+        self.subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.attr = self.subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+        self.token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+
+    def submit(self, data):
+        request = self.factory.post('/api/values/', json.dumps(data), content_type='application/json')
+        return async_to_sync(async_views.submit_data)(request)
+
+    def test_submit_data(self):
+        # When submitting data through the async view:
+        response = self.submit({
+            'uuid': str(self.subscription.uuid),
+            'auth_token': str(self.token.token),
+            'values': [{'attribute': 1, 'timestamp': '2020-02-26T12:29:05.059173Z', 'value': 22.3}]})
+
+        # Then a 201 response is received, listing the created value:
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content)['values'], [
+            {'attribute': 1, 'timestamp': '2020-02-26T12:29:05.059173Z', 'value': '22.3'}])
+
+        # And the value is stored:
+        self.assertEqual(self.attr.values.count(), 1)
+
+    def test_submit_data_not_authenticated(self):
+        response = self.submit({'uuid': str(self.subscription.uuid), 'auth_token': str(uuid.uuid4()), 'values': []})
+        self.assertEqual(response.status_code, 401)
+
+    def test_submit_invalid_data(self):
+        response = self.submit({
+            'uuid': str(self.subscription.uuid),
+            'auth_token': str(self.token.token),
+            'values': [{'attribute': 1, 'timestamp': 'yesterday', 'value': 22.3}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('timestamp', json.loads(response.content)['values'][0])
+
+    def test_retrieve_subscription(self):
+        # Given that there are some values stored for the subscription:
+        self.attr.values.create(timestamp=timezone.now(), value=22.5)
+
+        # When fetching the subscription through the async view:
+        request = self.factory.get('/api/subscriptions/')
+        response = async_to_sync(async_views.retrieve_subscription)(request, self.subscription.uuid)
+
+        # Then the response is identical to that of the DRF view:
+        self.assertEqual(response.status_code, 200)
+        drf_response = APIClient().get(reverse('subscription-detail', kwargs={'uuid': self.subscription.uuid}))
+        self.assertEqual(json.loads(response.content), json.loads(drf_response.content))
+        self.assertEqual(response['ETag'], drf_response['ETag'])
+
+    def test_retrieve_subscription_not_modified(self):
+        # When fetching the subscription again with the ETag of the previous response:
+        request = self.factory.get('/api/subscriptions/')
+        etag = async_to_sync(async_views.retrieve_subscription)(request, self.subscription.uuid)['ETag']
+        request = self.factory.get('/api/subscriptions/', HTTP_IF_NONE_MATCH=etag)
+        response = async_to_sync(async_views.retrieve_subscription)(request, self.subscription.uuid)
+
+        # Then a 304 response is received:
+        self.assertEqual(response.status_code, 304)
+
+    def test_retrieve_unknown_subscription(self):
+        request = self.factory.get('/api/subscriptions/')
+        response = async_to_sync(async_views.retrieve_subscription)(request, uuid.uuid4())
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,76 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from sensehel_logs_service import models
+
+
+class AttributeStatsTest(APITestCase):
+    url = reverse('values-create')
+
+    def setUp(self):
+        self.subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.attr = self.subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+        self.token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+
+    def submit(self, *values):
+        now = timezone.now()
+        return self.client.post(self.url, {
+            'uuid': self.subscription.uuid,
+            'auth_token': self.token.token,
+            'values': [{'attribute': 1, 'timestamp': now - timedelta(minutes=i), 'value': value}
+                       for i, value in enumerate(values)]
+        }, format='json')
+
+    def test_stats_updated_on_submit(self):
+        # When submitting values in two separate requests:
+        self.submit(20, 22.5)
+        self.submit(18, 19.5)
+
+        # Then the statistics of the attribute cover all of them:
+        self.attr.refresh_from_db()
+        self.assertEqual((self.attr.values_count, self.attr.values_min, self.attr.values_avg, self.attr.values_max),
+                         (4, Decimal('18'), Decimal('20'), Decimal('22.5')))
+
+    def test_rebuild_attribute_stats(self):
+        # Given values stored without updating the statistics:
+        now = timezone.now()
+        self.attr.values.create(timestamp=now, value=20)
+        self.attr.values.create(timestamp=now - timedelta(minutes=1), value=24)
+
+        # When rebuilding the statistics:
+        call_command('rebuild_attribute_stats', stdout=StringIO())
+
+        # Then they reflect the stored values:
+        self.attr.refresh_from_db()
+        self.assertEqual((self.attr.values_count, self.attr.values_min, self.attr.values_avg, self.attr.values_max),
+                         (2, Decimal('20'), Decimal('22'), Decimal('24')))
+
+    def test_stats_api(self):
+        # Given values submitted for an attribute:
+        self.submit(20, 22.5)
+
+        # When requesting the statistics of the subscription:
+        response = self.client.get(reverse('subscription-stats', kwargs={'uuid': self.subscription.uuid}))
+
+        # Then they are returned for each attribute:
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{
+            'id': 1, 'uri': 'temp', 'description': 'temperature',
+            'count': 2, 'min': '20.0', 'avg': '21.2500', 'max': '22.5'}])
+
+    def test_stats_api_without_values(self):
+        # When requesting the statistics of a subscription without values:
+        response = self.client.get(reverse('subscription-stats', kwargs={'uuid': self.subscription.uuid}))
+
+        # Then the count is 0 and the other statistics are empty:
+        self.assertEqual(response.json()[0]['count'], 0)
+        self.assertEqual(response.json()[0]['avg'], None)
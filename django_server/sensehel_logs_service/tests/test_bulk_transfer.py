@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from sensehel_logs_service import models
+
+
+class BulkTransferTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.start = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        self.attribute_types = [
+            models.SensorAttribute.objects.create(description='temperature', uri='temp'),
+            models.SensorAttribute.objects.create(description='humidity', uri='hum')]
+        self.source = self.create_subscription()
+        for attr in self.source.attributes.all():
+            models.Value.objects.bulk_create([
+                models.Value(attribute=attr, timestamp=self.start + timedelta(minutes=i), value=attr.attribute_id + i)
+                for i in range(5)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_subscription(self):
+        subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        for i, attribute_type in enumerate(self.attribute_types):
+            subscription.attributes.create(attribute_id=i + 1, attribute_type=attribute_type)
+        return subscription
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def values(self, subscription):
+        return list(models.Value.objects.filter(attribute__subscription=subscription)
+                    .order_by('attribute__attribute_id', 'timestamp')
+                    .values_list('attribute__attribute_id', 'timestamp', 'value'))
+
+    def test_export_and_import(self):
+        for file_format in ['ndjson', 'csv']:
+            with self.subTest(file_format):
+                # When exporting the values of a subscription, and importing them into another subscription:
+                path = self.path(f'values.{file_format}')
+                call_command('export_values', path, subscription=str(self.source.uuid), batch_size=3,
+                             stderr=StringIO())
+                target = self.create_subscription()
+                call_command('import_values', path, subscription=str(target.uuid), batch_size=3, stdout=StringIO())
+
+                # Then the target subscription has the same values:
+                self.assertEqual(len(self.values(target)), 10)
+                self.assertEqual(self.values(target), self.values(self.source))
+
+                # And the statistics of its attributes are updated:
+                self.assertEqual(target.attributes.get(attribute_id=2).values_count, 5)
+
+    def test_export_resumes(self):
+        # Given that the values of a subscription have been exported with a state file:
+        path, state_file = self.path('values.ndjson'), self.path('export.json')
+        call_command('export_values', path, subscription=str(self.source.uuid), state_file=state_file,
+                     stderr=StringIO())
+
+        # When exporting again after more values have been received:
+        attr = self.source.attributes.get(attribute_id=2)
+        models.Value.objects.create(attribute=attr, timestamp=self.start + timedelta(hours=1), value=20)
+        call_command('export_values', path, subscription=str(self.source.uuid), state_file=state_file,
+                     stderr=StringIO())
+
+        # Then only the new value is appended to the file:
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 11)
+        self.assertEqual((lines[-1]['attribute'], lines[-1]['value']), (2, 20))
+
+    def test_import_resumes(self):
+        # Given a file with 3 values:
+        path, state_file = self.path('values.csv'), self.path('import.json')
+        with open(path, 'w') as f:
+            f.write('attribute,timestamp,value\n')
+            f.writelines(f'1,{(self.start + timedelta(minutes=i)).isoformat()},{i}\n' for i in range(3))
+        target = self.create_subscription()
+
+        # When importing the file with a state file, and again after more values have been appended:
+        call_command('import_values', path, subscription=str(target.uuid), state_file=state_file, stdout=StringIO())
+        with open(path, 'a') as f:
+            f.write(f'1,{(self.start + timedelta(minutes=3)).isoformat()},3.25\n')
+        out = StringIO()
+        call_command('import_values', path, subscription=str(target.uuid), state_file=state_file, stdout=out)
+
+        # Then only the appended line is read the second time:
+        self.assertIn('4 lines read: 4 values imported, 0 duplicates skipped', out.getvalue())
+        self.assertEqual([value for _, _, value in self.values(target)],
+                         [Decimal('0'), Decimal('1'), Decimal('2'), Decimal('3.2')])
+
+        # And importing the file again without the state file skips the values already stored:
+        out = StringIO()
+        call_command('import_values', path, subscription=str(target.uuid), stdout=out)
+        self.assertIn('4 lines read: 0 values imported, 4 duplicates skipped', out.getvalue())
+
+    def test_import_invalid_values(self):
+        target = self.create_subscription()
+        for line, error in [('{"attribute": 9, "timestamp": "2020-01-01T00:00:00Z", "value": 1}', 'unknown attribute'),
+                            ('{"attribute": 1, "timestamp": "yesterday", "value": 1}', 'Invalid timestamp'),
+                            ('{"attribute": 1, "value": 1}', 'timestamp'),
+                            ('{"attribute": 1, "timestamp": "2020-01-01T00:00:00Z", "value": NaN}', 'finite'),
+                            ('{"attribute": 1, "timestamp": "2020-01-01T00:00:00Z", "value": 1e10}', 'less than')]:
+            with self.subTest(line):
+                # When importing a file with an invalid line:
+                path = self.path('invalid.ndjson')
+                with open(path, 'w') as f:
+                    f.write(line + '\n')
+
+                # Then the import fails, reporting the line:
+                with self.assertRaisesRegex(CommandError, f'Line 1: .*{error}'):
+                    call_command('import_values', path, subscription=str(target.uuid), stdout=StringIO())
@@ -0,0 +1,149 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from sensehel_logs_service import cold_storage, ingestion, models
+
+
+class ColdStorageTest(APITestCase):
+    def setUp(self):
+        self.subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.attr = self.subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+
+        # Values every 10 minutes, from 100 days ago until now:
+        now = timezone.now()
+        self.old = (now - timedelta(days=100)).replace(minute=0, second=0, microsecond=0)
+        self.timestamps = [self.old + timedelta(minutes=10 * i)
+                           for i in range((now - self.old) // timedelta(minutes=10))]
+        models.Value.objects.bulk_create([
+            models.Value(attribute=self.attr, timestamp=timestamp, value=Decimal(i % 300).scaleb(-1))
+            for i, timestamp in enumerate(self.timestamps)])
+
+    def test_encode_decode(self):
+        # When encoding rows with irregular timestamps and negative values:
+        rows = [(self.old, Decimal('-12.5')), (self.old + timedelta(microseconds=1), Decimal('0.0')),
+                (self.old + timedelta(hours=5, seconds=3), Decimal('99999999.9'))]
+        data = cold_storage.encode(rows)
+
+        # Then they are decoded exactly:
+        self.assertEqual(cold_storage.decode(data), rows)
+
+    def test_compress_values(self):
+        # When compressing the values older than 90 days:
+        call_command('compress_values', days=90, stdout=StringIO())
+
+        # Then the values of each day older than that are moved into one block:
+        cutoff = cold_storage.day_start((timezone.now() - timedelta(days=90)).date())
+        old_count = len([timestamp for timestamp in self.timestamps if timestamp < cutoff])
+        blocks = list(self.attr.value_blocks.all())
+        self.assertEqual([block.day for block in blocks],
+                         sorted(set(timestamp.date() for timestamp in self.timestamps if timestamp < cutoff)))
+        self.assertEqual(sum(block.count for block in blocks), old_count)
+        self.assertEqual(self.attr.values.count(), len(self.timestamps) - old_count)
+        self.attr.refresh_from_db()
+        self.assertEqual(self.attr.cold_until, cutoff)
+
+        # And values arriving late for a compressed day are merged into its block on the next run:
+        models.Value.objects.create(attribute=self.attr, timestamp=self.old + timedelta(minutes=5), value=1)
+        call_command('compress_values', days=90, stdout=StringIO())
+        self.assertEqual(sum(block.count for block in self.attr.value_blocks.all()), old_count + 1)
+
+    def test_compress_day_keeps_values_stored_meanwhile(self):
+        # Given a value stored for a day while it is being compressed, after its values have been read:
+        day = self.old.date()
+        late = models.Value(attribute=self.attr, timestamp=self.old + timedelta(minutes=5), value=1)
+        encode = cold_storage.encode
+
+        def encode_and_store(rows):
+            late.save()
+            return encode(rows)
+
+        with mock.patch.object(cold_storage, 'encode', encode_and_store):
+            moved = cold_storage.compress_day(self.attr, day)
+
+        # Then only the values read are moved to the block, the late value being left for the next run:
+        self.assertEqual(moved, self.attr.value_blocks.get().count)
+        start = cold_storage.day_start(day)
+        self.assertEqual(list(self.attr.values.filter(timestamp__gte=start, timestamp__lt=start + timedelta(days=1))),
+                         [late])
+
+    def test_compressed_values_are_not_stored_again(self):
+        # Given that the older values have been compressed:
+        call_command('compress_values', days=90, stdout=StringIO())
+        self.attr.refresh_from_db()
+        values_count = self.attr.values_count
+
+        # When storing values again for compressed days, one of them for a new timestamp:
+        values = [models.Value(attribute=self.attr, timestamp=timestamp, value=1) for timestamp in self.timestamps[:3]]
+        new_value = models.Value(attribute=self.attr, timestamp=self.old + timedelta(minutes=5), value=1)
+        inserted = ingestion.store_values(values + [new_value])
+
+        # Then only the value for the new timestamp is stored:
+        self.assertEqual(inserted, [new_value])
+        self.assertEqual(list(self.attr.values.filter(timestamp__lt=self.attr.cold_until)), [new_value])
+        self.attr.refresh_from_db()
+        self.assertEqual(self.attr.values_count, values_count + 1)
+
+    def test_retrieve_merges_cold_values(self):
+        # Given that the older values have been compressed:
+        call_command('compress_values', days=90, stdout=StringIO())
+
+        # When retrieving the subscription with all its values, or only with values since 95 days ago:
+        url = reverse('subscription-detail', kwargs={'uuid': self.subscription.uuid})
+        response = self.client.get(url)
+        since = self.old + timedelta(days=5)
+        since_response = self.client.get(url, {'values_timestamp_gt': since.isoformat()})
+
+        # Then all the values are returned in order, from cold storage and from the value table:
+        values = response.data['attributes'][0]['values']
+        self.assertEqual(len(values), len(self.timestamps))
+        self.assertEqual(values[0], {'timestamp': self.old.isoformat().replace('+00:00', 'Z'), 'value': '0.0'})
+        self.assertEqual([value['value'] for value in values[299:302]], ['29.9', '0.0', '0.1'])
+        self.assertEqual(len(since_response.data['attributes'][0]['values']),
+                         len([timestamp for timestamp in self.timestamps if timestamp > since]))
+
+        # And retrieving only recent values does not read cold storage:
+        with self.assertNumQueries(3):
+            self.client.get(url, {'values_timestamp_gt': (timezone.now() - timedelta(days=1)).isoformat()})
+
+    def test_export_merges_cold_values(self):
+        # Given that the older values have been compressed:
+        call_command('compress_values', days=90, stdout=StringIO())
+
+        # When exporting the values of a range spanning cold storage and the value table:
+        start, end = timezone.now() - timedelta(days=92), timezone.now() - timedelta(days=88)
+        response = self.client.get(reverse('subscription-export-csv', kwargs={'uuid': self.subscription.uuid}),
+                                   {'from': start.isoformat(), 'to': end.isoformat()})
+
+        # Then all the values in the range are exported, in order:
+        lines = b''.join(response.streaming_content).decode().splitlines()[1:]
+        self.assertEqual(len(lines), len([timestamp for timestamp in self.timestamps if start <= timestamp < end]))
+        self.assertEqual(lines, sorted(lines))
+
+    def test_page_merges_cold_values(self):
+        # Given that the older values have been compressed:
+        call_command('compress_values', days=90, stdout=StringIO())
+
+        # When paging through the values of a range spanning cold storage and the value table:
+        start, end = timezone.now() - timedelta(days=92), timezone.now() - timedelta(days=88)
+        url = reverse('subscription-attribute-values', kwargs={'uuid': self.subscription.uuid, 'attribute_id': 1})
+        params = {'from': start.isoformat(), 'to': end.isoformat(), 'limit': 100}
+        timestamps, more = [], True
+        while more:
+            response = self.client.get(url, params)
+            timestamps += [value['timestamp'] for value in response.data['values']]
+            params['cursor'], more = response.data['cursor'], response.data['more']
+
+        # Then all the values in the range are returned once, in order:
+        expected = [timestamp for timestamp in self.timestamps if start <= timestamp < end]
+        self.assertEqual(len(timestamps), len(expected))
+        self.assertEqual(timestamps, sorted(set(timestamps)))
@@ -0,0 +1,29 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from sensehel_logs_service import models
+
+
+class GenerateDataTest(TestCase):
+    def test_generate_data(self):
+        # When generating data for 2 subscriptions with 3 attributes of 100 values each:
+        call_command('generate_data', subscriptions=2, attributes=3, points=100, batch_size=40, seed=1,
+                     stdout=StringIO())
+
+        # Then the subscriptions, attributes and values are created:
+        self.assertEqual(models.Subscription.objects.count(), 2)
+        self.assertEqual(models.AttributeSubscription.objects.count(), 6)
+        self.assertEqual(models.Value.objects.count(), 600)
+
+        # And the values are one minute apart and realistic for the attribute type:
+        temperatures = models.Value.objects.filter(
+            attribute=models.AttributeSubscription.objects.filter(attribute_type__description='temperature').first())
+        timestamps = list(temperatures.values_list('timestamp', flat=True))
+        self.assertEqual(set(b - a for a, b in zip(timestamps, timestamps[1:])), {timestamps[1] - timestamps[0]})
+        self.assertEqual((timestamps[1] - timestamps[0]).total_seconds(), 60)
+        self.assertTrue(all(10 < value < 30 for value in temperatures.values_list('value', flat=True)))
+
+        # And the statistics are maintained through the regular ingestion path:
+        self.assertEqual(set(models.AttributeSubscription.objects.values_list('values_count', flat=True)), {100})
@@ -0,0 +1,48 @@
+import uuid
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from sensehel_logs_service import models
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are only checked on PostgreSQL')
+class ValueIndexTest(TestCase):
+    def setUp(self):
+        subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+        self.since = timezone.now() - timedelta(days=7)
+        # Values of other attributes too, for which a timestamp range is scattered all over the unique
+        # (attribute, timestamp) index:
+        attributes = [self.attr] + [
+            subscription.attributes.create(attribute_id=i, attribute_type=self.attr.attribute_type)
+            for i in range(2, 31)]
+        models.Value.objects.bulk_create([
+            models.Value(attribute=attr, value=20, timestamp=self.since + timedelta(minutes=i))
+            for attr in attributes for i in range(100)])
+
+        # The table is too small for the planner to prefer index scans on its own:
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE sensehel_logs_service_value')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_attribute_values_since_timestamp_use_composite_index(self):
+        # When planning the query used by subscription retrieve to fetch recent values of its attributes:
+        plan = models.Value.objects.filter(attribute__in=[self.attr.id], timestamp__gt=self.since)\
+            .order_by('attribute_id', 'timestamp').explain()
+
+        # Then it is served by the index of the unique (attribute, timestamp) constraint, named after the constraint
+        # or, in partitions, after its columns:
+        self.assertRegex(plan, r'Index (Only )?Scan using \S*(value_attribute_timestamp|attribute_id_timestamp)')
+
+    def test_timestamp_range_uses_brin_index(self):
+        # When planning a query over a timestamp range across all attributes:
+        plan = models.Value.objects.filter(timestamp__gte=self.since).explain()
+
+        # Then it is served by the BRIN index on timestamp:
+        self.assertIn('value_timestamp_brin', plan)
@@ -0,0 +1,65 @@
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from sensehel_logs_service import models
+from sensehel_logs_service.metrics import metrics
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(APITestCase):
+    url = reverse('metrics')
+
+    def setUp(self):
+        metrics.reset()
+        self.subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+        self.token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+
+    def get_metrics(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode().splitlines()
+
+    def test_request_metrics(self):
+        # When fetching a subscription twice:
+        detail_url = reverse('subscription-detail', kwargs={'uuid': self.subscription.uuid})
+        self.client.get(detail_url)
+        self.client.get(detail_url)
+
+        # Then the requests, their durations and their queries are reported for the view:
+        lines = self.get_metrics()
+        self.assertIn('sensehel_http_requests_total{view="subscription-detail",method="GET",status="200"} 2', lines)
+        self.assertIn('sensehel_http_request_duration_seconds_count{view="subscription-detail"} 2', lines)
+        self.assertIn('sensehel_http_request_duration_seconds_bucket{view="subscription-detail",le="+Inf"} 2', lines)
+        self.assertIn('sensehel_db_queries_total{view="subscription-detail"} 6', lines)
+
+    def test_ingestion_metrics(self):
+        # When submitting 3 values, one of them twice:
+        now = timezone.now()
+        self.client.post(reverse('values-create'), {
+            'uuid': self.subscription.uuid,
+            'auth_token': self.token.token,
+            'values': [{'attribute': 1, 'timestamp': now - timedelta(minutes=i), 'value': 20} for i in [0, 1, 2, 2]]
+        }, format='json')
+
+        # Then the ingested values and the duplicate are counted:
+        lines = self.get_metrics()
+        self.assertIn('sensehel_values_ingested_total 3', lines)
+        self.assertIn('sensehel_values_duplicate_total 1', lines)
+
+    def test_metrics_protected(self):
+        # Requests without the token are refused:
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        # But staff users can view the metrics:
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
@@ -0,0 +1,88 @@
+import uuid
+from datetime import datetime, timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from sensehel_logs_service import models, partitions
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The value table is only partitioned on PostgreSQL')
+class ValuePartitionTest(TestCase):
+    def setUp(self):
+        subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+        self.now = timezone.now()
+
+    def partition_of(self, value):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE id = %s', [value.id])
+            return cursor.fetchone()[0]
+
+    def test_ensure_partitions(self):
+        # Given a value stored beyond the months covered by partitions:
+        later = partitions.month_start(self.now, 2) + timedelta(days=3)
+        value = models.Value.objects.create(attribute=self.attr, value=20, timestamp=later)
+        self.assertEqual(self.partition_of(value), partitions.DEFAULT_PARTITION)
+
+        # When ensuring partitions for the next 2 months:
+        created = partitions.ensure_partitions(2, now=self.now)
+
+        # Then partitions are created for the months not yet covered:
+        self.assertEqual(created, [partitions.partition_name(partitions.month_start(self.now, i)) for i in [1, 2]])
+
+        # And the value is moved to the partition of its month:
+        self.assertEqual(self.partition_of(value), partitions.partition_name(partitions.month_start(later)))
+        self.assertEqual(models.Value.objects.get(id=value.id).timestamp, later)
+
+        # And ensuring them again creates nothing:
+        self.assertEqual(partitions.ensure_partitions(2, now=self.now), [])
+
+    def test_queries_are_pruned_to_partitions(self):
+        # Given partitions for the coming months:
+        partitions.ensure_partitions(3, now=self.now)
+
+        # When planning a query for values of the coming month:
+        since = partitions.month_start(self.now, 1)
+        plan = models.Value.objects.filter(attribute=self.attr, timestamp__gte=since,
+                                           timestamp__lt=since + timedelta(days=1)).explain()
+
+        # Then only the partition of that month is scanned:
+        self.assertIn(partitions.partition_name(since), plan)
+        self.assertNotIn(partitions.partition_name(partitions.month_start(self.now, 2)), plan)
+
+    def test_remove_partitions_before(self):
+        # Given partitions for the coming months, with values:
+        partitions.ensure_partitions(2, now=self.now)
+        for i in [1, 2]:
+            models.Value.objects.create(attribute=self.attr, value=i, timestamp=partitions.month_start(self.now, i))
+
+        # Run the foreign key checks deferred to the end of the test transaction, which would prevent dropping:
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        # When removing the partitions before the last one:
+        updated_at = models.Subscription.objects.get().updated_at
+        removed = partitions.remove_partitions_before(partitions.month_start(self.now, 2))
+
+        # Then the partitions holding only older values are dropped, including the one created by the migration:
+        self.assertEqual(len(removed), 2)
+        self.assertEqual([p[2] for p in partitions.list_partitions()], [partitions.month_start(self.now, 3)])
+
+        # And only the values of the remaining partition are left:
+        self.assertEqual(list(models.Value.objects.values_list('value', flat=True)), [2])
+
+        # And the subscription is marked as updated, invalidating the responses cached by clients:
+        self.assertGreater(models.Subscription.objects.get().updated_at, updated_at)
+
+
+class MonthStartTest(TestCase):
+    def test_month_start(self):
+        timestamp = datetime(2020, 11, 15, 12, tzinfo=timezone.utc)
+        self.assertEqual(partitions.month_start(timestamp), datetime(2020, 11, 1, tzinfo=timezone.utc))
+        self.assertEqual(partitions.month_start(timestamp, 2), datetime(2021, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(partitions.month_start(timestamp, -11), datetime(2019, 12, 1, tzinfo=timezone.utc))
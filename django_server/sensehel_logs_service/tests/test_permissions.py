@@ -0,0 +1,63 @@
+import uuid
+from types import SimpleNamespace
+
+from django.test import TestCase, override_settings
+
+from sensehel_logs_service import models
+from sensehel_logs_service.rest.permissions import SenseHelAuthPermission
+
+
+class SenseHelAuthPermissionTest(TestCase):
+    def has_permission(self, token):
+        return SenseHelAuthPermission().has_permission(SimpleNamespace(data={'auth_token': token}), None)
+
+    def test_valid_tokens_are_cached(self):
+        # Given that a valid token has been used once:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.assertTrue(self.has_permission(str(token.token)))
+
+        # When using it again,
+        # Then it is accepted without querying the database:
+        with self.assertNumQueries(0):
+            self.assertTrue(self.has_permission(str(token.token)))
+
+    def test_invalid_tokens_are_rejected(self):
+        self.assertFalse(self.has_permission(str(uuid.uuid4())))
+        self.assertFalse(self.has_permission('not a uuid'))
+        self.assertFalse(self.has_permission(None))
+
+    def test_deleted_token_is_rejected(self):
+        # Given that a valid token has been used and cached:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.assertTrue(self.has_permission(str(token.token)))
+
+        # When the token is deleted,
+        token.delete()
+
+        # Then it is no longer accepted:
+        self.assertFalse(self.has_permission(str(token.token)))
+
+    def test_changed_token_is_rejected(self):
+        # Given that a valid token has been used and cached:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        old_token = str(token.token)
+        self.assertTrue(self.has_permission(old_token))
+
+        # When the token is changed,
+        token.token = uuid.uuid4()
+        token.save()
+
+        # Then the old one is no longer accepted:
+        self.assertFalse(self.has_permission(old_token))
+
+    @override_settings(AUTH_TOKEN_CACHE='default')
+    def test_deleted_token_is_rejected_with_shared_cache(self):
+        # Given that tokens are cached in a shared cache, and a valid token has been used:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.assertTrue(self.has_permission(str(token.token)))
+
+        # When the token is deleted,
+        token.delete()
+
+        # Then it is no longer accepted:
+        self.assertFalse(self.has_permission(str(token.token)))
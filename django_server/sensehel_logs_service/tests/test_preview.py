@@ -0,0 +1,98 @@
+import gzip
+import json
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from sensehel_logs_service import models, preview
+
+
+class PreviewTest(APITestCase):
+    def setUp(self):
+        preview.cache().clear()
+        self.subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.attr = self.subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+        self.token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.url = reverse('subscription-preview', kwargs={'uuid': self.subscription.uuid})
+
+    def submit(self, *values):
+        return self.client.post(reverse('values-create'), {
+            'uuid': self.subscription.uuid,
+            'auth_token': self.token.token,
+            'values': [{'attribute': 1, 'timestamp': timestamp, 'value': value} for timestamp, value in values]
+        }, format='json')
+
+    def get_preview(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        return json.loads(gzip.decompress(response.content))
+
+    def test_preview(self):
+        # Given values submitted over the last 2 days:
+        now = timezone.now()
+        self.submit((now - timedelta(hours=30), 18), (now - timedelta(hours=2), 20), (now - timedelta(hours=1), 21))
+
+        # When requesting the preview:
+        data = self.get_preview()
+
+        # Then it contains the values of the last 24 hours in columnar format:
+        self.assertEqual(data['uuid'], str(self.subscription.uuid))
+        self.assertEqual(data['attributes'][0]['id'], 1)
+        self.assertEqual(data['attributes'][0]['values']['values'], [20, 21])
+
+        # And clients not accepting gzip get it uncompressed:
+        response = self.client.get(self.url)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(json.loads(response.content), data)
+
+    def test_preview_updated_on_submit(self):
+        # Given that the preview has been requested:
+        now = timezone.now()
+        self.submit((now - timedelta(hours=2), 20))
+        self.get_preview()
+
+        # When more values are submitted:
+        self.submit((now - timedelta(hours=1), 21), (now - timedelta(hours=3), 19))
+
+        # Then the preview includes them without querying values from the database:
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get_preview()
+        self.assertEqual(data['attributes'][0]['values']['values'], [19, 20, 21])
+        self.assertFalse([q for q in queries if models.Value._meta.db_table in q['sql']])
+
+    def test_stale_preview_rebuilt(self):
+        # Given that the preview has been requested:
+        now = timezone.now()
+        self.submit((now - timedelta(hours=2), 20))
+        self.get_preview()
+
+        # When values are stored without updating the cached preview, as by another process:
+        self.attr.values.create(timestamp=now - timedelta(hours=1), value=21)
+        models.Subscription.objects.filter(id=self.subscription.id).update(updated_at=timezone.now())
+
+        # Then the preview is rebuilt from the database:
+        self.assertEqual(self.get_preview()['attributes'][0]['values']['values'], [20, 21])
+
+    def test_concurrent_updates_not_lost(self):
+        # Given that the preview has been requested:
+        now = timezone.now()
+        self.submit((now - timedelta(hours=3), 19))
+        self.get_preview()
+        stale = preview.cache().get(preview.cache_key(self.subscription.uuid))
+
+        # When two submissions update the preview concurrently, both reading it before either writes it:
+        self.submit((now - timedelta(hours=2), 20))
+        with mock.patch.object(preview.cache(), 'get', return_value=stale):
+            self.submit((now - timedelta(hours=1), 21))
+
+        # Then the preview still includes the values of both submissions:
+        self.assertEqual(self.get_preview()['attributes'][0]['values']['values'], [19, 20, 21])
@@ -0,0 +1,63 @@
+import marshal
+import uuid
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from sensehel_logs_service import models
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.url = reverse('subscription-detail', kwargs={'uuid': self.subscription.uuid})
+        self.staff = User.objects.create_superuser('staff', 'staff@example.com', 'staff')
+
+    def test_profile_request(self):
+        # Given a logged in staff user:
+        self.client.force_login(self.staff)
+
+        # When requesting a subscription with profiling:
+        response = self.client.get(self.url, {'_profile': ''})
+
+        # Then the response is returned as usual:
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['uuid'], str(self.subscription.uuid))
+
+        # And the profile is stored, with the SQL timeline and the profile statistics:
+        profile = models.RequestProfile.objects.get()
+        self.assertEqual((profile.method, profile.path, profile.status_code), ('GET', self.url + '?_profile=', 200))
+        self.assertEqual(profile.query_count, len(profile.queries))
+        self.assertIn('sensehel_logs_service_subscription', profile.queries[0]['sql'])
+        self.assertIn('cumulative', profile.stats)
+        self.assertTrue(marshal.loads(bytes(profile.profile)))
+
+        # And it can be viewed and downloaded in the admin:
+        self.assertEqual(response['X-Profile-URL'],
+                         reverse('admin:sensehel_logs_service_requestprofile_change', args=[profile.id]))
+        self.assertContains(self.client.get(response['X-Profile-URL']), 'sensehel_logs_service_subscription')
+        download = self.client.get(reverse('admin:sensehel_logs_service_requestprofile_download', args=[profile.id]))
+        self.assertEqual(download.content, bytes(profile.profile))
+
+    def test_profile_as_text(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'_profile': 'text'})
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertIn('function calls', response.content.decode())
+
+    def test_profile_admin_changelist(self):
+        # The profiling parameter is not taken for a changelist filter:
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:sensehel_logs_service_value_changelist'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('admin:sensehel_logs_service_value_changelist'), {'_profile': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(models.RequestProfile.objects.count(), 2)
+
+    def test_profiling_staff_only(self):
+        # When anonymous users request profiling, the request is not profiled:
+        response = self.client.get(self.url, {'_profile': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-URL', response)
+        self.assertEqual(models.RequestProfile.objects.count(), 0)
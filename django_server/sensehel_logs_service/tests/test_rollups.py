@@ -0,0 +1,65 @@
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from sensehel_logs_service import models
+
+
+class RollupTest(APITestCase):
+    url = reverse('values-create')
+    start = datetime(2020, 2, 26, 12, 0, tzinfo=timezone.utc)
+
+    def setUp(self):
+        self.subscription = models.Subscription.objects.create(uuid=uuid.uuid4())
+        self.attr = self.subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri='temp'))
+        self.token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+
+    def submit(self, *values):
+        return self.client.post(self.url, {
+            'uuid': self.subscription.uuid,
+            'auth_token': self.token.token,
+            'values': [{'attribute': 1, 'timestamp': timestamp, 'value': value} for timestamp, value in values]
+        }, format='json')
+
+    def test_rollups_updated_on_submit(self):
+        # When submitting values in two separate requests, spanning two hours of the same day:
+        self.submit((self.start, 20), (self.start + timedelta(minutes=30), 22))
+        self.submit((self.start + timedelta(minutes=45), 18), (self.start + timedelta(minutes=90), 25))
+
+        # Then hourly rollups are maintained for each hour:
+        first, second = models.HourlyRollup.objects.filter(attribute=self.attr)
+        self.assertEqual((first.bucket, first.count, first.sum, first.min, first.max),
+                         (self.start, 3, Decimal('60'), Decimal('18'), Decimal('22')))
+        self.assertEqual((second.bucket, second.count, second.min, second.max),
+                         (self.start + timedelta(hours=1), 1, Decimal('25'), Decimal('25')))
+
+        # And a daily rollup is maintained for the day:
+        day = models.DailyRollup.objects.get(attribute=self.attr)
+        self.assertEqual((day.bucket, day.count, day.avg, day.min, day.max),
+                         (self.start.replace(hour=0), 4, Decimal('21.25'), Decimal('18'), Decimal('25')))
+
+    def test_rebuild_rollups(self):
+        # Given that values have been stored without going through data submission:
+        models.Value.objects.bulk_create([
+            models.Value(attribute=self.attr, value=20 + i, timestamp=self.start + timedelta(minutes=20 * i))
+            for i in range(6)])
+
+        # When rebuilding the rollups:
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        # Then they reflect the stored values:
+        self.assertEqual(
+            list(models.HourlyRollup.objects.values_list('bucket', 'count', 'min', 'max')),
+            [(self.start, 3, Decimal('20'), Decimal('22')),
+             (self.start + timedelta(hours=1), 3, Decimal('23'), Decimal('25'))])
+        self.assertEqual(
+            list(models.DailyRollup.objects.values_list('bucket', 'count', 'sum')),
+            [(self.start.replace(hour=0), 6, Decimal('135'))])
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from sensehel_logs_service import models
+from sensehel_logs_service.rest.serializers import ValueSerializer, serialize_values
+
+
+class SerializeValuesTest(SimpleTestCase):
+    def test_same_representation_as_value_serializer(self):
+        # Given some values with and without fractional seconds and decimals:
+        start = datetime(2020, 2, 26, 12, 29, 5, 59173, tzinfo=timezone.utc)
+        rows = [(start + timedelta(seconds=i * 0.5), Decimal(value))
+                for i, value in enumerate(['22.5', '-3.0', '0.0', '123456789.1'])]
+
+        # When representing them through the fast path:
+        fast = serialize_values(rows)
+
+        # Then the representation is identical to the one produced by ValueSerializer:
+        instances = [models.Value(timestamp=timestamp, value=value) for timestamp, value in rows]
+        self.assertEqual(fast, [dict(value) for value in ValueSerializer(instances, many=True).data])
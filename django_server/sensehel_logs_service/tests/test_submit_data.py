@@ -1,12 +1,19 @@
+import time
 import uuid
+from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
 
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.test import APITestCase
 
-from sensehel_logs_service import models
+from sensehel_logs_service import ingestion, models, write_behind
 
 
 class SubmitDataTest(APITestCase):
@@ -43,7 +50,317 @@ class SubmitDataTest(APITestCase):
             'values': [{
                 'attribute': 1,
                 'timestamp': serializers.DateTimeField().to_representation(self.timestamp),
-                'value': '22.3'}]})
+                'value': '22.3'}],
+            'accepted': 1,
+            'duplicates': 0})
 
         # And new values are created for the subscription:
         self.assertEqual(attr.values.get().value, Decimal('22.3'))
+
+    @override_settings(VALUES_INSERT_BATCH_SIZE=2)
+    def test_submit_data_in_batches(self):
+        # Given that there is a subscription for an attribute:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+
+        # When requesting to submit 5 new values for the subscribed attribute, with an insert batch size of 2:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        values = [dict(self.data_fields['values'][0], timestamp=self.timestamp + timedelta(minutes=i), value=20 + i)
+                  for i in range(5)]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url, dict(self.data_fields, values=values, auth_token=token.token), format='json')
+
+        # Then the values are inserted with 3 queries:
+        value_inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "sensehel_logs_service_value"')]
+        self.assertEqual(len(value_inserts), 3)
+
+        # And a 201 response is received, listing all the created values:
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['values']), 5)
+
+        # And all the values are stored for the subscription:
+        self.assertEqual(attr.values.count(), 5)
+
+    def test_repeated_submissions_need_no_lookups(self):
+        # Given that there is a subscription for an attribute, for which data has already been submitted:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+        # When submitting more data for the subscription:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+        # Then the data is handled without any queries to look up the token or the subscription:
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([q['sql'] for q in queries if q['sql'].startswith('SELECT')], [])
+
+        # And the repeated value is not stored again:
+        self.assertEqual((response.data['accepted'], response.data['duplicates']), (0, 1))
+        self.assertEqual(attr.values.count(), 1)
+
+    def test_subscription_changes_by_other_processes_are_seen_after_cache_ttl(self):
+        # Given that data has been submitted for a subscription:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+        # When the subscription is cancelled by another process, without signals here:
+        models.Subscription.objects.filter(id=subscription.id).update(deleted=True)
+
+        # Then submissions are only refused once the cached attribute ids have expired:
+        later = dict(self.data_fields['values'][0], timestamp=self.timestamp + timedelta(minutes=1))
+        data = dict(self.data_fields, values=[later], auth_token=token.token)
+        self.assertEqual(self.client.post(self.url, data, format='json').status_code, 201)
+        expired = time.monotonic() + settings.SUBSCRIPTION_CACHE_TTL + 1
+        with mock.patch('sensehel_logs_service.caches.time.monotonic', return_value=expired):
+            self.assertEqual(self.client.post(self.url, data, format='json').status_code, 404)
+
+    def test_resubmitted_values_are_not_stored_twice(self):
+        # Given that a value has been submitted for an attribute:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+        # When retrying the submission along with a new value, itself submitted twice:
+        later = dict(self.data_fields['values'][0], timestamp=self.timestamp + timedelta(minutes=1), value=25)
+        values = self.data_fields['values'] + [later, dict(later, value=30)]
+        response = self.client.post(self.url, dict(self.data_fields, values=values, auth_token=token.token),
+                                    format='json')
+
+        # Then only the new value is accepted, its first submission kept:
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['accepted'], response.data['duplicates']), (1, 2))
+        self.assertEqual([value.value for value in attr.values.all()], [Decimal('22.3'), Decimal('25')])
+
+        # And the statistics and rollups count each value once:
+        attr.refresh_from_db()
+        self.assertEqual(attr.values_count, 2)
+        self.assertEqual(sum(models.HourlyRollup.objects.filter(attribute=attr).values_list('count', flat=True)), 2)
+
+    def test_write_behind_database_unavailable(self):
+        # Given a queued submission:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        buffer = write_behind.WriteBehindBuffer(autostart=False)
+        buffer.submit([models.Value(attribute=attr, timestamp=self.timestamp, value=Decimal('1.0'))])
+
+        # When the database is unavailable on flushing the queue:
+        unavailable = mock.Mock(side_effect=OperationalError('the database system is shutting down'))
+        with mock.patch.object(write_behind.ingestion, 'store_values', unavailable), \
+                self.assertLogs(write_behind.logger, 'WARNING'):
+            buffer.flush()
+
+            # Then the submission is kept, without counting as a failed attempt:
+            self.assertEqual([attempts for _, attempts in buffer.retries], [0])
+            self.assertEqual(buffer.stats()['depth'], 1)
+
+            # And it is not retried again until the backoff delay has passed:
+            buffer.flush()
+            self.assertEqual(unavailable.call_count, 1)
+            self.assertEqual(buffer.backoff, settings.VALUES_WRITE_BEHIND_FLUSH_INTERVAL)
+
+        # And once the database is available again, the value is stored:
+        buffer.retry_at = 0
+        buffer.flush()
+        self.assertEqual(attr.values.get().value, Decimal('1.0'))
+        self.assertEqual(buffer.stats(), {'depth': 0, 'enqueued': 1, 'written': 1, 'duplicates': 0,
+                                          'retried': 1, 'failed': 0, 'rejected': 0})
+        self.assertEqual(buffer.backoff, 0)
+
+    def test_submit_out_of_range_values(self):
+        # Given that there is a subscription for an attribute:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+
+        for value in ['1e10', '1e30', '-999999999.96']:
+            with self.subTest(value):
+                # When submitting a value too large to be stored:
+                values = [dict(self.data_fields['values'][0], value=value)]
+                response = self.client.post(
+                    self.url, dict(self.data_fields, values=values, auth_token=token.token), format='json')
+
+                # Then a 400 response is received:
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('value', response.data['values'][0])
+
+        # And the largest value which can be stored is accepted, rounded:
+        values = [dict(self.data_fields['values'][0], value='-999999999.94')]
+        response = self.client.post(
+            self.url, dict(self.data_fields, values=values, auth_token=token.token), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(attr.values.get().value, Decimal('-999999999.9'))
+
+    def test_resubmitted_values_skipped_without_unique_constraint(self):
+        # Given that the unique constraint on values exists once migrated:
+        self.assertTrue(ingestion.has_unique_constraint())
+
+        # And given that a value has been submitted for an attribute, before the constraint was added:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        with mock.patch.object(ingestion, 'has_unique_constraint', return_value=False):
+            self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+            # When retrying the submission along with a new value, itself submitted twice:
+            later = dict(self.data_fields['values'][0], timestamp=self.timestamp + timedelta(minutes=1), value=25)
+            values = self.data_fields['values'] + [later, dict(later, value=30)]
+            response = self.client.post(self.url, dict(self.data_fields, values=values, auth_token=token.token),
+                                        format='json')
+
+        # Then only the new value is stored, as with the constraint:
+        self.assertEqual((response.data['accepted'], response.data['duplicates']), (1, 2))
+        self.assertEqual([value.value for value in attr.values.all()], [Decimal('22.3'), Decimal('25')])
+
+    def test_submit_data_after_unsubscribe(self):
+        # Given that data has been submitted for a subscription:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+        # And given that the subscription has since been cancelled:
+        self.client.post(reverse('subscription-unsubscribe'), {'uuid': subscription.uuid, 'auth_token': token.token})
+
+        # When submitting more data for the subscription:
+        response = self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+        # Then a 404 response is received:
+        self.assertEqual(response.status_code, 404)
+
+    def test_updated_at_never_moves_backwards(self):
+        # Given that there is a subscription for an attribute:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+
+        # When values are stored by a slow transaction, while another one storing values commits in the meantime:
+        update_rollups = ingestion.update_rollups
+        stamps = []
+
+        def update_rollups_slowly(values):
+            update_rollups(values)
+            if values[0].value == 1:
+                ingestion.store_values([models.Value(attribute=attr, timestamp=self.timestamp, value=2)])
+                stamps.append(models.Subscription.objects.get().updated_at)
+
+        with mock.patch.object(ingestion, 'update_rollups', update_rollups_slowly):
+            ingestion.store_values([models.Value(attribute=attr, timestamp=self.timestamp - timedelta(hours=1),
+                                                 value=1)])
+
+        # Then the subscription is stamped after the transaction which committed first:
+        self.assertGreater(models.Subscription.objects.get().updated_at, stamps[0])
+
+        # And it is never stamped back in time:
+        later = stamps[0] + timedelta(hours=1)
+        models.Subscription.objects.update(updated_at=later)
+        ingestion.store_values([models.Value(attribute=attr, timestamp=self.timestamp + timedelta(hours=1), value=3)])
+        self.assertEqual(models.Subscription.objects.get().updated_at, later)
+
+    @override_settings(VALUES_WRITE_BEHIND=True, VALUES_WRITE_BEHIND_MAX_QUEUE=2)
+    def test_submit_data_write_behind(self):
+        # Given that there is a subscription for an attribute:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+
+        # And given that the service is running in write-behind mode, with room for 2 values in the queue:
+        buffer = write_behind.WriteBehindBuffer(autostart=False)
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        with mock.patch.object(write_behind, 'buffer', buffer):
+
+            # When requesting to submit new data for the subscribed attribute:
+            response = self.client.post(self.url, dict(self.data_fields, auth_token=token.token), format='json')
+
+            # Then a 202 response is received:
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['values'][0]['value'], '22.3')
+
+            # And the value is queued rather than stored:
+            self.assertEqual(buffer.stats()['depth'], 1)
+            self.assertEqual(attr.values.count(), 0)
+
+            # And when submitting more values than there is room for in the queue:
+            values = self.data_fields['values'] * 2
+            response = self.client.post(
+                self.url, dict(self.data_fields, values=values, auth_token=token.token), format='json')
+
+            # Then a 503 response is received:
+            self.assertEqual(response.status_code, 503)
+
+        # And when the queue is flushed, the queued value is stored:
+        buffer.flush()
+        self.assertEqual(attr.values.get().value, Decimal('22.3'))
+        self.assertEqual(buffer.stats(),
+                         {'depth': 0, 'enqueued': 1, 'written': 1, 'duplicates': 0, 'retried': 0, 'failed': 0,
+                          'rejected': 2})
+
+    @override_settings(VALUES_WRITE_BEHIND_MAX_ATTEMPTS=2)
+    def test_write_behind_failures(self):
+        # Given 2 queued submissions, the values of one of which fail to be written:
+        subscription = models.Subscription.objects.create(uuid=self.data_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+        good = models.Value(attribute=attr, timestamp=self.timestamp, value=Decimal('1.0'))
+        bad = models.Value(attribute=attr, timestamp=self.timestamp + timedelta(seconds=1), value=Decimal('2.0'))
+        buffer = write_behind.WriteBehindBuffer(autostart=False)
+        buffer.submit([good])
+        buffer.submit([bad])
+
+        store_values = write_behind.ingestion.store_values
+
+        def failing_store_values(values):
+            if bad in values:
+                raise ValueError('Bad value')
+            return store_values(values)
+
+        with mock.patch.object(write_behind.ingestion, 'store_values', failing_store_values), \
+                self.assertLogs(write_behind.logger, 'WARNING'):
+            # When flushing the queue:
+            buffer.flush()
+
+            # Then the values of the other submission are stored, and the failed submission is kept for a retry:
+            self.assertEqual(attr.values.get().value, Decimal('1.0'))
+            self.assertEqual(buffer.stats(), {'depth': 1, 'enqueued': 2, 'written': 1, 'duplicates': 0,
+                                              'retried': 1, 'failed': 0, 'rejected': 0})
+
+            # And when it still fails on the next flush, it is given up on:
+            buffer.flush()
+            self.assertEqual(buffer.stats(), {'depth': 0, 'enqueued': 2, 'written': 1, 'duplicates': 0,
+                                              'retried': 1, 'failed': 1, 'rejected': 0})
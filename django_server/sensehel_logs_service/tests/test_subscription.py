@@ -1,11 +1,15 @@
 import uuid
+from datetime import datetime, timedelta
+from io import StringIO
 
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.test import APITestCase
 
-from sensehel_logs_service import models
+from sensehel_logs_service import ingestion, models
 
 
 class SubscriptionTest(APITestCase):
@@ -111,6 +115,192 @@ class SubscriptionTest(APITestCase):
             }]
         })
 
+    def test_fetch_subscription_data_query_count(self):
+        # Given that there is a subscription for 5 attributes, each with some values:
+        subscription = models.Subscription.objects.create(uuid=self.subscription_fields['uuid'])
+        for i in range(5):
+            attr = subscription.attributes.create(
+                attribute_id=i + 1,
+                attribute_type=models.SensorAttribute.objects.create(description=f'attr {i}', uri=f'attr {i}'))
+            attr.values.create(timestamp=timezone.now(), value=i)
+
+        # When requesting to fetch the subscription,
+        # Then the subscription, its attributes with their types and their values are fetched with 3 queries:
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('subscription-detail', kwargs={'uuid': subscription.uuid}))
+
+        # And all attributes are included with their values:
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(attr['values']) for attr in response.data['attributes']], [1] * 5)
+
+    def test_fetch_subscription_data_conditionally(self):
+        # Given that the subscription has been fetched before:
+        subscription = models.Subscription.objects.create(uuid=self.subscription_fields['uuid'])
+        subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri=self.temp_uri))
+        models.Subscription.objects.filter(id=subscription.id).update(updated_at=timezone.now() - timedelta(minutes=1))
+        url = reverse('subscription-detail', kwargs={'uuid': subscription.uuid})
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        # When fetching it again with the validators of the previous response,
+        # Then a 304 response is received, having only looked up the subscription:
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # And when new data has since been submitted:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.client.post(reverse('values-create'), {
+            'uuid': subscription.uuid, 'auth_token': token.token,
+            'values': [{'attribute': 1, 'timestamp': timezone.now(), 'value': 22.5}]}, format='json')
+
+        # Then the new data is returned:
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['attributes'][0]['values']), 1)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+        # And when the data changes again right after being fetched, possibly within the same second:
+        last_modified = response['Last-Modified']
+        models.Subscription.objects.filter(id=subscription.id).update(updated_at=timezone.now())
+
+        # Then fetching it with the Last-Modified just received does not give a 304:
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_fetch_downsampled_subscription_data(self):
+        # Given that there is a subscription for an attribute:
+        subscription = models.Subscription.objects.create(uuid=self.subscription_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(
+                description='temperature', uri=self.temp_uri))
+
+        # And given that there are 100 values stored for the subscription, including a single spike:
+        start = timezone.now() - timedelta(hours=2)
+        models.Value.objects.bulk_create([
+            models.Value(attribute=attr, timestamp=start + timedelta(minutes=i), value=50 if i == 42 else 20)
+            for i in range(100)])
+
+        # When requesting to fetch the subscription with at most 10 points per attribute:
+        url = reverse('subscription-detail', kwargs={'uuid': subscription.uuid})
+        response = self.client.get(url, {'max_points': 10})
+
+        # Then a 200 response is received:
+        self.assertEqual(response.status_code, 200)
+
+        # And it contains 10 values, including the first and last value and the spike:
+        values = response.data['attributes'][0]['values']
+        self.assertEqual(len(values), 10)
+        self.assertEqual(values[0]['timestamp'], serializers.DateTimeField().to_representation(start))
+        self.assertEqual(values[-1]['timestamp'],
+                         serializers.DateTimeField().to_representation(start + timedelta(minutes=99)))
+        self.assertIn('50.0', [value['value'] for value in values])
+
+    def test_fetch_columnar_subscription_data(self):
+        # Given that there is a subscription for an attribute with some values:
+        subscription = models.Subscription.objects.create(uuid=self.subscription_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri=self.temp_uri))
+        start = datetime(2020, 2, 26, 12, 29, 5, 59173, tzinfo=timezone.utc)
+        for i, value in enumerate([22.5, 23]):
+            attr.values.create(timestamp=start + timedelta(minutes=i), value=value)
+
+        # When requesting to fetch the subscription in columnar format:
+        url = reverse('subscription-detail', kwargs={'uuid': subscription.uuid})
+        response = self.client.get(url, {'values_format': 'columnar'})
+
+        # Then the values are returned as arrays of epoch millisecond timestamps and of numbers:
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['attributes'][0]['values'], {
+            'timestamps': [1582720145059, 1582720205059],
+            'values': [22.5, 23]
+        })
+
+        # And unknown formats are rejected:
+        self.assertEqual(self.client.get(url, {'values_format': 'xml'}).status_code, 400)
+
+    def test_export_csv(self):
+        # Given that there is a subscription for two attributes:
+        subscription = models.Subscription.objects.create(uuid=self.subscription_fields['uuid'])
+        temperature, humidity = [
+            subscription.attributes.create(
+                attribute_id=i + 1,
+                attribute_type=models.SensorAttribute.objects.create(description=description, uri=description))
+            for i, description in enumerate(['temperature', 'humidity'])]
+
+        # And given that there are some values stored for both attributes:
+        start = timezone.now() - timedelta(hours=2)
+        for i in range(3):
+            temperature.values.create(timestamp=start + timedelta(hours=i), value=20 + i)
+            humidity.values.create(timestamp=start + timedelta(hours=i), value=40 + i)
+
+        # When requesting to export the values of one attribute from a given time onwards as CSV:
+        url = reverse('subscription-export-csv', kwargs={'uuid': subscription.uuid})
+        response = self.client.get(url, {'attribute': 2, 'from': start + timedelta(hours=1)})
+
+        # Then a 200 response is received:
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        # And it streams the matching values of that attribute:
+        timestamp = serializers.DateTimeField().to_representation
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [
+            'timestamp,value',
+            f'{timestamp(start + timedelta(hours=1))},41.0',
+            f'{timestamp(start + timedelta(hours=2))},42.0'])
+
+        # And when requesting to export all values:
+        response = self.client.get(url)
+
+        # Then the values of all attributes are included, labelled by attribute:
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'attribute,timestamp,value')
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['temperature'] * 3 + ['humidity'] * 3)
+
+    def test_page_attribute_values(self):
+        # Given that there is a subscription for an attribute with 5 values, 2 of them a second apart:
+        subscription = models.Subscription.objects.create(uuid=self.subscription_fields['uuid'])
+        attr = subscription.attributes.create(
+            attribute_id=7,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri=self.temp_uri))
+        start = timezone.now() - timedelta(hours=1)
+        for seconds, value in [(0, 1), (60, 2), (61, 3), (120, 4), (180, 5)]:
+            attr.values.create(timestamp=start + timedelta(seconds=seconds), value=value)
+        url = reverse('subscription-attribute-values', kwargs={'uuid': subscription.uuid, 'attribute_id': 7})
+
+        # When paging through the values 2 at a time:
+        pages, cursor = [], None
+        while True:
+            response = self.client.get(url, dict({'limit': 2}, **({'cursor': cursor} if cursor else {})))
+            self.assertEqual(response.status_code, 200)
+            pages.append([value['value'] for value in response.data['values']])
+            cursor = response.data['cursor']
+            if not response.data['more']:
+                break
+
+        # Then all values are returned in order, each exactly once:
+        self.assertEqual(pages, [['1.0', '2.0'], ['3.0', '4.0'], ['5.0']])
+
+        # And values received later can be fetched with the last cursor:
+        attr.values.create(timestamp=start + timedelta(minutes=4), value=6)
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual([value['value'] for value in response.data['values']], ['6.0'])
+
+        # And the values can be limited to a time range:
+        response = self.client.get(url, {'from': start + timedelta(minutes=1), 'to': start + timedelta(minutes=3)})
+        self.assertEqual([value['value'] for value in response.data['values']], ['2.0', '3.0', '4.0'])
+
+        # And an invalid cursor or an unknown attribute are rejected:
+        self.assertEqual(self.client.get(url, {'cursor': 'nonsense'}).status_code, 400)
+        url = reverse('subscription-attribute-values', kwargs={'uuid': subscription.uuid, 'attribute_id': 8})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
     def test_unsubscribe(self):
         # Given that there is a subscription for an attribute:
         subscription = models.Subscription.objects.create(uuid=self.subscription_fields['uuid'])
@@ -130,5 +320,67 @@ class SubscriptionTest(APITestCase):
         # Then a 204 response is received:
         self.assertEqual(response.status_code, 204)
 
-        # And the subscription is deleted from the db:
+        # And the subscription is no longer available:
         self.assertEqual(0, models.Subscription.objects.count())
+        response = self.client.get(reverse('subscription-detail', kwargs={'uuid': subscription.uuid}))
+        self.assertEqual(response.status_code, 404)
+
+        # And its values are left for purge_subscriptions to delete:
+        self.assertTrue(models.Subscription.all_objects.get(id=subscription.id).deleted)
+        self.assertEqual(attr.values.count(), 1)
+
+    def test_subscribe_again_after_unsubscribe(self):
+        # Given a subscription which has been unsubscribed, but not yet purged:
+        token = models.AuthenticationToken.objects.create(token=uuid.uuid4())
+        self.client.post(self.url, dict(self.subscription_fields, auth_token=token.token), format='json')
+        old = models.Subscription.objects.get()
+        response = self.client.post(reverse('subscription-unsubscribe'), {'uuid': old.uuid, 'auth_token': token.token})
+        self.assertEqual(response.status_code, 204)
+
+        # When subscribing again with the same UUID:
+        response = self.client.post(self.url, dict(self.subscription_fields, auth_token=token.token), format='json')
+
+        # Then a new, empty subscription is created, next to the one left for purge_subscriptions:
+        self.assertEqual(response.status_code, 201)
+        subscription = models.Subscription.objects.get(uuid=old.uuid)
+        self.assertNotEqual(subscription.id, old.id)
+        self.assertTrue(models.Subscription.all_objects.get(id=old.id).deleted)
+
+        # And data can be submitted for it:
+        response = self.client.post(reverse('values-create'), {
+            'uuid': subscription.uuid, 'auth_token': token.token,
+            'values': [{'attribute': 1, 'timestamp': timezone.now(), 'value': 22.5}]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(subscription.attributes.get().values.count(), 1)
+
+    @override_settings(SUBSCRIPTION_PURGE_BATCH_SIZE=2)
+    def test_purge_subscriptions(self):
+        # Given an unsubscribed subscription with values:
+        subscription = models.Subscription.objects.create(uuid=uuid.uuid4(), deleted=True)
+        attr = subscription.attributes.create(
+            attribute_id=1,
+            attribute_type=models.SensorAttribute.objects.create(description='temperature', uri=self.temp_uri))
+        now = timezone.now()
+        ingestion.store_values([models.Value(attribute=attr, timestamp=now - timedelta(hours=i), value=i)
+                                for i in range(5)])
+
+        # And another subscription with values:
+        other = models.Subscription.objects.create(uuid=uuid.uuid4())
+        other_attr = other.attributes.create(attribute_id=1, attribute_type=attr.attribute_type)
+        other_attr.values.create(timestamp=now, value=1)
+
+        # When purging unsubscribed subscriptions:
+        output = StringIO()
+        call_command('purge_subscriptions', stdout=output)
+
+        # Then the values are deleted in batches:
+        self.assertIn('deleted 4 values', output.getvalue())
+        self.assertIn('deleted 5 values', output.getvalue())
+
+        # And the unsubscribed subscription is deleted along with all its data:
+        self.assertFalse(models.Subscription.all_objects.filter(id=subscription.id).exists())
+        self.assertEqual(models.HourlyRollup.objects.filter(attribute_id=attr.id).count(), 0)
+        self.assertEqual(models.AttributeSubscription.objects.filter(id=attr.id).count(), 0)
+
+        # And other subscriptions are left alone:
+        self.assertEqual(other_attr.values.count(), 1)
@@ -0,0 +1,208 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, connection
+
+from sensehel_logs_service import ingestion
+
+logger = logging.getLogger(__name__)
+
+
+# Errors from the database being unreachable, e.g. while it restarts, after which writing is retried later without
+# counting as a failed attempt:
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class DatabaseUnavailable(Exception):
+    """
+    Raised by WriteBehindBuffer.write on a transient error, with the submissions left to write.
+    """
+    def __init__(self, submissions):
+        super().__init__()
+        self.submissions = submissions
+
+
+def describe(values):
+    return [(value.attribute_id, value.timestamp.isoformat(), str(value.value)) for value in values]
+
+
+class WriteBehindBuffer:
+    """
+    In-process queue of validated, unsaved Value instances, written to the database in large batches by a
+    background thread. See VALUES_WRITE_BEHIND in the settings.
+
+    Values are queued by submission, as (values, attempts) pairs. If the database is unreachable, nothing is written
+    until a delay has passed, doubled with each consecutive such failure up to VALUES_WRITE_BEHIND_MAX_BACKOFF
+    seconds, and submissions keep being queued. If writing a batch fails otherwise, its submissions are written one
+    at a time, so that a single bad submission does not lose the values of the others; the submissions which still
+    fail are kept for the next flush, and only given up on, with their values logged, after
+    VALUES_WRITE_BEHIND_MAX_ATTEMPTS attempts.
+    """
+    def __init__(self, autostart=True):
+        self.autostart = autostart
+        self.submissions = []
+        self.retries = []
+        self.depth = 0
+        self.backoff = 0
+        self.retry_at = 0
+        self.condition = threading.Condition()
+        self.writer = None
+        self.stopping = False
+        self.counters = {'enqueued': 0, 'written': 0, 'duplicates': 0, 'retried': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, values):
+        """
+        Queue the values for writing. Returns False, without queueing anything, if the queue is full.
+        """
+        with self.condition:
+            if self.depth + len(values) > settings.VALUES_WRITE_BEHIND_MAX_QUEUE:
+                self.counters['rejected'] += len(values)
+                return False
+            self.submissions.append((values, 0))
+            self.depth += len(values)
+            self.counters['enqueued'] += len(values)
+            if self.queued() >= settings.VALUES_WRITE_BEHIND_BATCH_SIZE:
+                self.condition.notify()
+        if self.autostart:
+            self.start()
+        return True
+
+    def queued(self):
+        """
+        Return the number of values queued since the last flush, not counting those kept for a retry.
+        """
+        return self.depth - sum(len(values) for values, _ in self.retries)
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counters, depth=self.depth)
+
+    def start(self):
+        with self.condition:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, name='values-write-behind', daemon=True)
+                self.writer.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Stop the writer thread after it has written all queued values.
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.writer is not None:
+            self.writer.join()
+
+    def run(self):
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(
+                        lambda: self.stopping or (self.queued() >= settings.VALUES_WRITE_BEHIND_BATCH_SIZE
+                                                  and time.monotonic() >= self.retry_at),
+                        timeout=settings.VALUES_WRITE_BEHIND_FLUSH_INTERVAL)
+                    stopping = self.stopping
+                # Only here: flush() may also be called from a thread whose connection is in use.
+                close_old_connections()
+                self.flush(final=stopping)
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def flush(self, final=False):
+        """
+        Write all queued values, submissions kept for a retry first, in batches of at most
+        VALUES_WRITE_BEHIND_BATCH_SIZE values, unless waiting for the database to be reachable again. Submissions
+        which fail are kept for a later flush, unless `final`.
+        """
+        with self.condition:
+            if not final and time.monotonic() < self.retry_at:
+                return
+            pending = self.retries + self.submissions
+            self.retries, self.submissions = [], []
+
+        batches, batch, size = [], [], 0
+        for values, attempts in pending:
+            if batch and size + len(values) > settings.VALUES_WRITE_BEHIND_BATCH_SIZE:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append((values, attempts))
+            size += len(values)
+        if batch:
+            batches.append(batch)
+
+        retries, unavailable = [], None
+        for i, batch in enumerate(batches):
+            try:
+                retries.extend(self.write(batch, final))
+            except DatabaseUnavailable as e:
+                unavailable = e
+                retries.extend(e.submissions + [submission for batch in batches[i + 1:] for submission in batch])
+                break
+        retried = sum(len(values) for values, _ in retries)
+
+        if unavailable and final:
+            values = [value for submission, _ in retries for value in submission]
+            logger.error(f'Database unavailable, dropping {len(values)} queued values: {describe(values)}',
+                         exc_info=unavailable.__cause__)
+        elif unavailable:
+            backoff = min(max(self.backoff * 2, settings.VALUES_WRITE_BEHIND_FLUSH_INTERVAL),
+                          settings.VALUES_WRITE_BEHIND_MAX_BACKOFF)
+            logger.warning(f'Database unavailable, retrying {retried} queued values in {backoff:g}s: '
+                           f'{unavailable.__cause__}')
+
+        with self.condition:
+            if unavailable and final:
+                self.counters['failed'] += retried
+                retries, retried = [], 0
+            elif unavailable:
+                self.backoff, self.retry_at = backoff, time.monotonic() + backoff
+            else:
+                self.backoff = 0
+            self.retries.extend(retries)
+            self.counters['retried'] += retried
+            self.depth -= sum(len(values) for values, _ in pending) - retried
+
+    def write(self, batch, final=False):
+        """
+        Write a batch of queued submissions, in a single transaction or else one submission at a time. Return the
+        submissions to retry on the next flush, or raise DatabaseUnavailable with those left to write.
+        """
+        values = [value for submission, _ in batch for value in submission]
+        try:
+            inserted = ingestion.store_values(values)
+        except TRANSIENT_ERRORS as e:
+            raise DatabaseUnavailable(batch) from e
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning(f'Failed to write {len(values)} queued values, retrying by submission: {e}')
+                retries = []
+                for i, submission in enumerate(batch):
+                    try:
+                        retries.extend(self.write([submission], final))
+                    except DatabaseUnavailable as unavailable:
+                        raise DatabaseUnavailable(retries + batch[i:]) from unavailable.__cause__
+                return retries
+
+            attempts = batch[0][1] + 1
+            if final or attempts >= settings.VALUES_WRITE_BEHIND_MAX_ATTEMPTS:
+                logger.exception(f'Failed to write {len(values)} queued values after {attempts} attempts, '
+                                 f'dropping them: {describe(values)}')
+                with self.condition:
+                    self.counters['failed'] += len(values)
+                return []
+            logger.warning(f'Failed to write {len(values)} queued values, retrying on the next flush: {e}')
+            return [(batch[0][0], attempts)]
+        else:
+            with self.condition:
+                self.counters['written'] += len(inserted)
+                self.counters['duplicates'] += len(values) - len(inserted)
+            return []
+
+
+buffer = WriteBehindBuffer()
@@ -2,7 +2,6 @@ import React from 'react';
 import {BrowserRouter as Router, Route, Switch} from "react-router-dom";
 
 import SubscriptionPlot from "components/SubscriptionPlot";
-import moment from "moment";
 import {SubscriptionReport} from "components/SubscriptionReport";
 
 type RouterProps = {}
@@ -14,12 +13,11 @@ export default class AppRouter extends React.Component<RouterProps> {
 
   render() {
     const subscriptionUUID = this.getSubscriptionUUID() as string;
-    const oneDay = moment().subtract(1, 'days').toISOString();
     return (
       <Router>
         <Switch>
           <Route path='/preview/'>
-            <SubscriptionPlot subscriptionUUID={subscriptionUUID} from={oneDay}/>
+            <SubscriptionPlot subscriptionUUID={subscriptionUUID} preview/>
           </Route>
           <Route path='/'>
             <SubscriptionReport subscriptionUUID={subscriptionUUID}/>
@@ -1,14 +1,16 @@
 import React from 'react';
-import {AttributeSubscription, Subscription} from "components/types";
+import {AttributeSubscription, ColumnarValues, Subscription} from "components/types";
 // @ts-ignore
 import Plot from 'react-plotly.js';
 import sessionRequest from "sessionRequest";
-import {subscriptionUrl} from "urls";
+import {csvExportUrl, previewUrl, subscriptionUrl} from "urls";
+import settings from "settings.json";
 import {Alert, Button, Spinner} from "reactstrap";
 
 type SubscriptionReportProps = {
   subscriptionUUID: string,
   from?: any, // Timestamp in some form
+  preview?: boolean, // Plot the cached last 24 hours instead, ignoring from
   displayModeBar?: boolean,
   title?: string,
   provideCSV?: boolean,
@@ -20,7 +22,7 @@ export default class SubscriptionPlot extends React.Component<SubscriptionReport
   btnColors = ['primary', 'secondary', 'danger', 'success']
 
   state:
-    {subscription: Subscription | null, error: boolean, loading: boolean}
+    {subscription: Subscription<ColumnarValues> | null, error: boolean, loading: boolean}
     =
     {subscription: null, error: false, loading: true};
 
@@ -35,9 +37,14 @@ export default class SubscriptionPlot extends React.Component<SubscriptionReport
   }
 
   private fetchSubscription() {
-    const {subscriptionUUID, from} = this.props;
+    const {subscriptionUUID, from, preview} = this.props;
+    // Plots only need about one point per horizontal pixel; CSV exports are streamed by the server:
+    const maxPoints = window.innerWidth;
+    const url = preview ?
+      previewUrl(subscriptionUUID)
+      : subscriptionUrl(subscriptionUUID as string, from, maxPoints, 'columnar');
     this.setState({error: false, loading: true});
-    sessionRequest(subscriptionUrl(subscriptionUUID as string, from)).then(response => {
+    sessionRequest(url).then(response => {
       if (response.status >= 400) this.setState({error: true, loading: false});
       else response.json().then(subscription => this.setState({subscription, loading: false}));
     });
@@ -78,7 +85,7 @@ export default class SubscriptionPlot extends React.Component<SubscriptionReport
 
   private getLayout() {
     const {title, displayModeBar, height} = this.props;
-    const attributes = (this.state.subscription as Subscription).attributes;
+    const attributes = (this.state.subscription as Subscription<ColumnarValues>).attributes;
     const px = 1 / window.innerWidth;
     const yaxisWidth = 24*px;
 
@@ -87,7 +94,7 @@ export default class SubscriptionPlot extends React.Component<SubscriptionReport
       height: height || Math.min(window.innerHeight, window.innerWidth),
       margin: {l: 0, r: 8, t: (title || displayModeBar) ? 32 : 10},
       title: title || '',
-      xaxis: {domain: [4 * px + yaxisWidth * attributes.length, 1]},
+      xaxis: {type: 'date', domain: [4 * px + yaxisWidth * attributes.length, 1]},
       legend: {orientation: 'h', bgcolor: 'transparent'},
       ...Object.fromEntries(attributes.map(({description}, i) =>
         [`yaxis${i ? i + 1 : ''}`, {
@@ -103,10 +110,11 @@ export default class SubscriptionPlot extends React.Component<SubscriptionReport
   }
 
   getPlotData() {
-    const subscription = this.state.subscription as Subscription;
+    const subscription = this.state.subscription as Subscription<ColumnarValues>;
     return subscription.attributes.map(({description, values}, i) => ({
-      x: values.map(({timestamp}) => timestamp),
-      y: values.map(({value}) => value),
+      // Epoch milliseconds, plotted as dates thanks to the date type of the x axis:
+      x: values.timestamps,
+      y: values.values,
       type: 'scatter',
       mode: 'lines',
       name: description,
@@ -116,9 +124,8 @@ export default class SubscriptionPlot extends React.Component<SubscriptionReport
     }))
   }
 
-  private csvURI(attribute: AttributeSubscription) {
-    return encodeURI(
-      "data:text/csv;charset=utf-8,timestamp,value\n" +
-      attribute.values.map(({timestamp, value}) => [timestamp, value].join(',')).join('\n'));
+  private csvURI(attribute: AttributeSubscription<ColumnarValues>) {
+    const {subscriptionUUID, from} = this.props;
+    return settings.serverRoot + csvExportUrl(subscriptionUUID, attribute.id, from);
   }
 }
@@ -3,14 +3,21 @@ export type Value = {
   timestamp: string
 }
 
-export type AttributeSubscription = {
+// Values as returned with values_format=columnar:
+export type ColumnarValues = {
+  timestamps: number[], // Epoch milliseconds
+  values: number[]
+}
+
+export type AttributeSubscription<V = Value[]> = {
+  id: number,
   description: string,
   uri: string
   attribute_id: number,
-  values: Value[]
+  values: V
 }
 
-export type Subscription = {
+export type Subscription<V = Value[]> = {
   uuid: string,
-  attributes: AttributeSubscription[]
+  attributes: AttributeSubscription<V>[]
 }
@@ -1,2 +1,16 @@
-export const subscriptionUrl = (uuid: string, from?: any) =>
-  `api/subscriptions/${uuid}/${from ? `?values_timestamp_gt=${from}` : ''}`;
+export const subscriptionUrl = (uuid: string, from?: any, maxPoints?: number, valuesFormat?: 'columnar') => {
+  const params = new URLSearchParams();
+  if (from) params.set('values_timestamp_gt', from);
+  if (maxPoints) params.set('max_points', String(maxPoints));
+  if (valuesFormat) params.set('values_format', valuesFormat);
+  const query = params.toString();
+  return `api/subscriptions/${uuid}/${query ? `?${query}` : ''}`;
+};
+
+export const csvExportUrl = (uuid: string, attributeId: number, from?: any) => {
+  const params = new URLSearchParams({attribute: String(attributeId)});
+  if (from) params.set('from', from);
+  return `api/subscriptions/${uuid}/export.csv/?${params.toString()}`;
+};
+
+export const previewUrl = (uuid: string) => `api/subscriptions/${uuid}/preview/`;